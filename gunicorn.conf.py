@@ -0,0 +1,39 @@
+"""Gunicorn settings for webapp_new.py.
+
+Run with:  gunicorn -c gunicorn.conf.py webapp_new:app
+
+Face encoding is CPU-bound and holds the GIL, so parallelism comes from worker
+processes; the threads per worker overlap storage/DB round trips.
+
+On CPU-only dlib builds `preload_app` imports face_recognition/dlib once in the
+master so the workers share the model pages via fork copy-on-write. A CUDA
+build (dlib.DLIB_USE_CUDA, which makes the detector default to `cnn`) must not
+touch the GPU before fork: a CUDA context created in the master breaks the
+forked workers' first GPU call, so preloading is turned off there and each
+worker imports the app itself.
+
+The model warm-up (see _warm_face_models, FACE_WARMUP=0 to skip) runs in each
+worker after it has loaded the app (`post_worker_init`), never in the master.
+"""
+import multiprocessing
+import os
+
+try:
+	import dlib  # type: ignore
+	_DLIB_USE_CUDA = bool(getattr(dlib, 'DLIB_USE_CUDA', False))
+except Exception:
+	_DLIB_USE_CUDA = False
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS') or multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS') or 8)
+timeout = int(os.getenv('GUNICORN_TIMEOUT') or 60)
+preload_app = not _DLIB_USE_CUDA
+
+
+def post_worker_init(worker):
+	import webapp_new
+
+	if webapp_new.coerce_bool(os.getenv('FACE_WARMUP', '1')):
+		webapp_new._warm_face_models()
@@ -48,7 +48,8 @@ CREATE TABLE IF NOT EXISTS public.embeddings (
 -- should enable pgvector and convert `embedding` to `vector(128)` and
 -- create an appropriate index.
 
--- Nearest-neighbour function for pgvector (L2)
+-- Nearest-neighbour function for pgvector (L2). The server's login query
+-- inlines the same SELECT; the function is kept for SQL / RPC callers.
 CREATE OR REPLACE FUNCTION public.find_nearest_embeddings(
   query_embedding vector,
   match_limit INT DEFAULT 1
@@ -59,6 +60,7 @@ RETURNS TABLE (
   dist FLOAT
 )
 LANGUAGE SQL
+STABLE
 AS $$
   SELECT id, user_id, (embedding <-> query_embedding) AS dist
   FROM public.embeddings
@@ -66,6 +68,89 @@ AS $$
   LIMIT match_limit;
 $$;
 
+-- ANN index so find_nearest_embeddings walks an HNSW graph instead of
+-- scanning every row. Only created once `embedding` has been converted to
+-- vector(128) (or halfvec(128), see below); the float8[] fallback column cannot
+-- be indexed this way.
+-- Build options scale with the table: m=16, ef_construction=64 (pgvector's
+-- defaults) under 100k rows, 24 / 100 under 1M, 32 / 128 above. The server's
+-- per-login hnsw.ef_search follows the same tiers (40 / 100 / 200). Re-running
+-- the script rebuilds the index only when the table has moved to another tier.
+-- Large tables build much faster with e.g.
+--   SET maintenance_work_mem = '2GB'; SET max_parallel_maintenance_workers = 7;
+-- in the same session.
+DO $$
+DECLARE
+  n BIGINT;
+  opts TEXT[];
+  col_type TEXT;
+BEGIN
+  SELECT udt_name INTO col_type FROM information_schema.columns
+  WHERE table_schema = 'public' AND table_name = 'embeddings'
+    AND column_name = 'embedding';
+  IF col_type IN ('vector', 'halfvec') THEN
+    SELECT count(*) INTO n FROM public.embeddings;
+    opts := CASE
+      WHEN n < 100000 THEN ARRAY['m=16', 'ef_construction=64']
+      WHEN n < 1000000 THEN ARRAY['m=24', 'ef_construction=100']
+      ELSE ARRAY['m=32', 'ef_construction=128']
+    END;
+    RAISE NOTICE 'embeddings: % rows, HNSW options %', n, opts;
+    IF EXISTS (
+      SELECT 1 FROM pg_class
+      WHERE oid = to_regclass('public.embeddings_embedding_hnsw_idx')
+        AND (reloptions IS DISTINCT FROM opts
+             OR pg_get_indexdef(oid) NOT LIKE '%' || col_type || '_l2_ops%')
+    ) THEN
+      DROP INDEX public.embeddings_embedding_hnsw_idx;
+    END IF;
+    EXECUTE format(
+      'CREATE INDEX IF NOT EXISTS embeddings_embedding_hnsw_idx ON public.embeddings USING hnsw (embedding %s_l2_ops) WITH (%s)',
+      col_type, array_to_string(opts, ', ')
+    );
+  END IF;
+END
+$$;
+
+-- Optional: store embeddings as halfvec (fp16, pgvector >= 0.7). Halves the
+-- row and HNSW index size (256 vs 512 bytes per embedding); the L2 distances
+-- change by far less than the login threshold's margin. Run once, after the
+-- column is vector(128), then restart the server. It detects the column type
+-- per connection: inserts are written as ::vector text (assignment-cast to
+-- halfvec) and the login query casts its query vector to halfvec so the index
+-- is still used; the function below does the same for SQL callers.
+--
+-- DROP INDEX IF EXISTS public.embeddings_embedding_hnsw_idx;  -- vector_l2_ops can't index halfvec
+-- ALTER TABLE public.embeddings
+--   ALTER COLUMN embedding TYPE halfvec(128) USING embedding::halfvec(128);
+--
+-- then re-run the index block above, which rebuilds the HNSW index with
+-- halfvec_l2_ops (it follows the column type), and replace the function:
+--
+-- CREATE OR REPLACE FUNCTION public.find_nearest_embeddings(
+--   query_embedding vector,
+--   match_limit INT DEFAULT 1
+-- )
+-- RETURNS TABLE (embedding_id UUID, user_id UUID, dist FLOAT)
+-- LANGUAGE SQL
+-- STABLE
+-- AS $$
+--   SELECT id, user_id, (embedding <-> query_embedding::halfvec(128)) AS dist
+--   FROM public.embeddings
+--   ORDER BY embedding <-> query_embedding::halfvec(128)
+--   LIMIT match_limit;
+-- $$;
+
+-- Optional: two-stage login search (pgvector >= 0.7). An HNSW index over the
+-- binary-quantized embeddings (1 bit per dimension, 16 bytes per row) is walked
+-- first; the server then re-ranks those candidates by exact L2 distance. Enable
+-- it with LOGIN_PREFILTER_CANDIDATES (e.g. 200) once the table is large enough
+-- that the full-precision index no longer fits in memory; below that the
+-- single-stage search is both faster and exact. No extra column is needed.
+--
+-- CREATE INDEX IF NOT EXISTS embeddings_embedding_bit_hnsw_idx
+--   ON public.embeddings USING hnsw ((binary_quantize(embedding)::bit(128)) bit_hamming_ops);
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE public.users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.user_images ENABLE ROW LEVEL SECURITY;
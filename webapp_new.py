@@ -1,9 +1,11 @@
-import base64
+import binascii
+import hashlib
 import io
 import os
 import time
 import uuid
-from typing import Tuple, Optional
+from datetime import datetime
+from typing import NamedTuple, Tuple, Optional
 
 from flask import Flask, jsonify, render_template, request
 from PIL import Image
@@ -11,7 +13,52 @@ from dotenv import load_dotenv
 import logging
 import sys
 import json
+import threading
+import queue
+from collections import OrderedDict
+import cv2
 import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+
+# face_recognition loads dlib's detector/encoder models at import time, so do it
+# once at worker boot rather than on the first request. Image upload still works
+# without it; face detection/encoding endpoints report it as unavailable.
+try:
+	import face_recognition
+	FACE_RECOGNITION_ERROR = None
+except Exception as exc:
+	face_recognition = None
+	FACE_RECOGNITION_ERROR = str(exc)
+
+# Optional orjson-backed JSON provider (Flask >= 2.2); stdlib json otherwise.
+try:
+	import orjson
+	from flask.json.provider import DefaultJSONProvider
+except Exception:
+	orjson = None
+
+# SIMD base64 decoder when available; stdlib fallback has the same signature.
+try:
+	from pybase64 import b64decode as _b64decode
+except Exception:
+	from base64 import b64decode as _b64decode
+
+# libjpeg-turbo decoder (PyTurboJPEG) for JPEG bytes when the native library is present.
+try:
+	from turbojpeg import TurboJPEG, TJPF_RGB
+	_turbojpeg = TurboJPEG()
+except Exception:
+	_turbojpeg = None
+
+# psycopg2's Json wrapper for jsonb params; plain JSON text if it's unavailable.
+try:
+	from psycopg2.extras import Json
+except Exception:
+	def Json(obj):
+		return json.dumps(obj) if obj is not None else None
 
 load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -28,13 +75,111 @@ if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
 	except Exception:
 		sb = None
 
+# Storage configuration can't change at runtime, so check it once.
+_STORAGE_READY = bool(sb and SUPABASE_BUCKET)
+
+# Shared HTTP session so storage/CDN fetches reuse keep-alive TCP+TLS connections
+# instead of paying a fresh handshake on every request.
+http_session = requests.Session()
+# Size the keep-alive pool for concurrent request threads (the default keeps 10
+# connections per host). Failed connects and gateway errors on idempotent
+# requests (GET/HEAD) are retried twice with a short backoff; the last response
+# is returned as-is for the caller's raise_for_status().
+_http_adapter = HTTPAdapter(
+	pool_connections=16,
+	pool_maxsize=64,
+	max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=(502, 503, 504), raise_on_status=False),
+)
+http_session.mount('https://', _http_adapter)
+http_session.mount('http://', _http_adapter)
+
+# Worker threads for storage round trips and face encoding, so a handler can
+# overlap them instead of running each step back to back.
+_IO_POOL = ThreadPoolExecutor(max_workers=int(os.getenv('IO_POOL_WORKERS') or 8))
+
 APP_ROOT = os.path.dirname(__file__)
 DATA_DIR = os.path.join(APP_ROOT, 'data')
 DEBUG_DIR = os.path.join(DATA_DIR, 'debug')
 os.makedirs(DEBUG_DIR, exist_ok=True)
 
+# Face detection runs on a copy whose longest side is capped at this many pixels;
+# encodings are still computed on the full-resolution image.
+FACE_DETECT_MAX_SIDE = int(os.getenv('FACE_DETECT_MAX_SIDE') or 640)
+
+# Jittered re-samples averaged into embeddings stored at enrollment (register,
+# capture, attach). Higher is steadier but costs ~linearly more CPU per image;
+# login always uses 1.
+FACE_ENROLL_JITTERS = max(1, int(os.getenv('FACE_ENROLL_JITTERS') or 1))
+
+# Format images are stored in: `webp` re-encodes uploads (capped at
+# STORAGE_MAX_SIDE px) to cut upload time and bucket size; `original` stores the
+# bytes exactly as received.
+STORAGE_FORMAT = (os.getenv('STORAGE_FORMAT') or 'webp').strip().lower()
+STORAGE_MAX_SIDE = int(os.getenv('STORAGE_MAX_SIDE') or 1600)
+STORAGE_WEBP_QUALITY = int(os.getenv('STORAGE_WEBP_QUALITY') or 85)
+
+# Longest side requested from Supabase image transformation for login downloads
+# (a paid-plan feature); 0 fetches originals.
+STORAGE_TRANSFORM_MAX_SIDE = int(os.getenv('STORAGE_TRANSFORM_MAX_SIDE') or 0)
+
+# Candidate list size for the login HNSW search (pgvector's hnsw.ef_search,
+# default 40 there). Higher raises recall at some cost per query. Unset (0)
+# picks it from the table's estimated row count, see _HNSW_EF_SEARCH_BY_SIZE.
+HNSW_EF_SEARCH = min(1000, int(os.getenv('HNSW_EF_SEARCH') or 0)) or None
+
+# When > 0, login first takes this many candidates by Hamming distance over
+# binary-quantized embeddings (needs the optional bit index in
+# supabase_setup.sql), then re-ranks them by exact L2 distance.
+LOGIN_PREFILTER_CANDIDATES = min(1000, int(os.getenv('LOGIN_PREFILTER_CANDIDATES') or 0))
+
+
+def _dlib_has_cuda() -> bool:
+	"""Return True when the installed dlib was built with DLIB_USE_CUDA."""
+	try:
+		import dlib  # type: ignore
+
+		return bool(getattr(dlib, 'DLIB_USE_CUDA', False))
+	except Exception:
+		return False
+
+
+def _default_detector_model() -> str:
+	"""Pick the first-pass face detector.
+
+	`FACE_DETECTOR_MODEL` (hog|cnn) wins when set. Otherwise use `cnn` when dlib
+	was built with CUDA (the GPU CNN is both faster and more accurate than CPU
+	HOG there) and fall back to the CPU `hog` detector.
+	"""
+	model = (os.getenv('FACE_DETECTOR_MODEL') or '').strip().lower()
+	if model in ('hog', 'cnn'):
+		return model
+	return 'cnn' if DLIB_USE_CUDA else 'hog'
+
+
+DLIB_USE_CUDA = _dlib_has_cuda()
+FACE_DETECTOR_MODEL = _default_detector_model()
+
 app = Flask(__name__, template_folder='templates')
 
+if orjson is not None:
+	class ORJSONProvider(DefaultJSONProvider):
+		"""Encode/decode request and response JSON with orjson.
+
+		Dates are passed through to Flask's default hook so their wire format
+		matches the stdlib provider; numpy scalars/arrays serialize natively, and
+		non-str dict keys (ints, UUIDs, ...) are stringified as the stdlib does
+		instead of raising TypeError.
+		"""
+		option = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+		def dumps(self, obj, **kwargs):
+			return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+		def loads(self, s, **kwargs):
+			return orjson.loads(s)
+
+	app.json = ORJSONProvider(app)
+
 # Configure logging to stdout so terminal shows logs reliably
 logging.basicConfig(stream=sys.stdout, level=logging.DEBUG, format='%(asctime)s %(levelname)s %(message)s', force=True)
 app.logger.handlers = []
@@ -44,6 +189,7 @@ formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
 handler.setFormatter(formatter)
 app.logger.addHandler(handler)
 app.logger.setLevel(logging.DEBUG)
+app.logger.info('face detection: detector=%s dlib_cuda=%s', FACE_DETECTOR_MODEL, DLIB_USE_CUDA)
 
 
 @app.before_request
@@ -71,26 +217,52 @@ def _set_cors_headers(response):
 _HAS_VECTOR = None
 
 
-def _detect_vector_type() -> bool:
-	global _HAS_VECTOR
+# Check both pg_extension (installation) and pg_type (type existence with schema)
+_VECTOR_TYPE_EXISTS_SQL = "SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector') OR EXISTS(SELECT 1 FROM pg_type t JOIN pg_namespace n ON t.typnamespace = n.oid WHERE t.typname = 'vector')"
+
+# Type of public.embeddings.embedding ('_float8', 'vector', 'halfvec'), or NULL
+# before the table exists; decides how embeddings are bound on insert
+_EMBEDDING_COLUMN_TYPE_SQL = "SELECT t.typname FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid WHERE a.attrelid = to_regclass('public.embeddings') AND a.attname = 'embedding' AND NOT a.attisdropped"
+
+
+# A negative pgvector result is re-checked at most this often, so installing the
+# extension is picked up without a restart but logins without it don't each
+# pay a catalog query.
+_VECTOR_RECHECK_SECONDS = 60.0
+_HAS_VECTOR_CHECKED_AT = 0.0
+
+
+def _detect_vector_type(cur=None) -> bool:
+	"""Whether pgvector is available, cached for the process.
+
+	Runs the probe on `cur` when given (saving a second pool checkout),
+	otherwise on a connection of its own.
+	"""
+	global _HAS_VECTOR, _HAS_VECTOR_CHECKED_AT
 	# If we've previously determined pgvector exists, return cached True immediately.
 	if _HAS_VECTOR is True:
 		return True
-	# Otherwise, re-check the DB (this allows a prior False cache to be re-evaluated
-	# after migrations or admin changes).
+	# A prior False is re-evaluated once it is old enough (migrations or admin changes).
+	now = time.monotonic()
+	if _HAS_VECTOR is False and now - _HAS_VECTOR_CHECKED_AT < _VECTOR_RECHECK_SECONDS:
+		return False
+	_HAS_VECTOR_CHECKED_AT = now
 	try:
+		if cur is not None:
+			cur.execute(_VECTOR_TYPE_EXISTS_SQL)
+			_HAS_VECTOR = bool(cur.fetchone()[0])
+			return _HAS_VECTOR
 		conn = None
 		try:
 			conn = get_db_conn()
 			cur = conn.cursor()
-			# Check both pg_extension (installation) and pg_type (type existence with schema)
-			cur.execute("SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector') OR EXISTS(SELECT 1 FROM pg_type t JOIN pg_namespace n ON t.typnamespace = n.oid WHERE t.typname = 'vector')")
+			cur.execute(_VECTOR_TYPE_EXISTS_SQL)
 			_HAS_VECTOR = bool(cur.fetchone()[0])
 			cur.close()
 		finally:
 			try:
 				if conn:
-					conn.close()
+					release_db_conn(conn)
 			except Exception:
 				pass
 	except Exception:
@@ -99,12 +271,15 @@ def _detect_vector_type() -> bool:
 	return _HAS_VECTOR
 
 
+_TRUTHY = frozenset(('1', 'true', 'yes', 'on'))
+
+
 def coerce_bool(value: Optional[str]) -> bool:
 	if isinstance(value, bool):
 		return value
 	if value is None:
 		return False
-	return str(value).strip().lower() in {'1', 'true', 'yes', 'on'}
+	return str(value).strip().lower() in _TRUTHY
 
 
 def _get_actor_user_id():
@@ -133,29 +308,138 @@ def _get_actor_user_id():
 	return None
 
 
+# Process-wide psycopg2 pool, created on first use so the app still imports
+# without SUPABASE_DB_URL / psycopg2.
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+
+# Connections kept open / allowed at once per process. Size DB_POOL_MAX to at
+# least the worker's thread count (GUNICORN_THREADS) plus the I/O pool; callers
+# beyond it wait up to DB_POOL_TIMEOUT seconds for a free connection instead of
+# failing straight away.
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN') or 2)
+DB_POOL_MAX = max(DB_POOL_MIN, int(os.getenv('DB_POOL_MAX') or 16))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT') or 10)
+_DB_POOL_SLOTS = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+def _get_db_pool():
+	global _DB_POOL
+	if _DB_POOL is not None:
+		return _DB_POOL
+	with _DB_POOL_LOCK:
+		if _DB_POOL is None:
+			try:
+				import psycopg2.extensions  # type: ignore
+				from psycopg2.pool import ThreadedConnectionPool  # type: ignore
+			except Exception as exc:
+				raise RuntimeError('psycopg2 is required: ' + str(exc))
+
+			class _PooledConnection(psycopg2.extensions.connection):
+				# set once the per-session search_path has been applied
+				search_path_set = False
+				# thread that currently has this connection checked out
+				owner_thread = None
+				# whether pgvector is available, probed alongside the search_path setup
+				has_vector = None
+				# type name of public.embeddings.embedding, probed in the same round trip
+				embedding_type = None
+
+			class _RetainingPool(ThreadedConnectionPool):
+				def __init__(self, minconn, maxconn, *args, **kwargs):
+					super().__init__(minconn, maxconn, *args, **kwargs)
+					# minconn only sizes the eager opens; psycopg2 also closes any connection
+					# returned while minconn are idle, so raise it to keep up to maxconn for reuse
+					self.minconn = maxconn
+
+			_DB_POOL = _RetainingPool(
+				DB_POOL_MIN,
+				DB_POOL_MAX,
+				SUPABASE_DB_URL,
+				connection_factory=_PooledConnection,
+				keepalives=1,
+				keepalives_idle=30,
+			)
+	return _DB_POOL
+
+
 def get_db_conn():
+	"""Check out a pooled connection; hand it back with release_db_conn()."""
+	global _HAS_VECTOR
 	if not SUPABASE_DB_URL:
 		raise RuntimeError('SUPABASE_DB_URL not set')
+	pool = _get_db_pool()
+	# ThreadedConnectionPool raises once exhausted; queue for a slot instead
+	if not _DB_POOL_SLOTS.acquire(timeout=DB_POOL_TIMEOUT):
+		raise RuntimeError('timed out waiting for a database connection')
 	try:
-		import psycopg2  # type: ignore
-	except Exception as exc:
-		raise RuntimeError('psycopg2 is required: ' + str(exc))
-	conn = psycopg2.connect(SUPABASE_DB_URL)
-	conn.autocommit = False
-	# Ensure pgvector types in a non-public schema (e.g. vector_ext) are visible
-	# by preferring that schema in the search_path. This lets casts like ::vector
-	# resolve when the extension is installed into `vector_ext`.
-	try:
-		cur = conn.cursor()
-		# prefer vector_ext then public; if schema doesn't exist this is a no-op
-		cur.execute("SET search_path = vector_ext, public;")
-		cur.close()
+		conn = pool.getconn()
+		if conn.closed:
+			# server dropped it while idle in the pool; replace with a fresh one
+			pool.putconn(conn, close=True)
+			conn = pool.getconn()
 	except Exception:
-		# best-effort: if this fails, leave connection as-is and let callers handle errors
-		app.logger.debug('failed to set search_path to include vector_ext')
+		_DB_POOL_SLOTS.release()
+		raise
+	conn.owner_thread = threading.get_ident()
+	if not conn.search_path_set:
+		# Ensure pgvector types in a non-public schema (e.g. vector_ext) are visible
+		# by preferring that schema in the search_path. This lets casts like ::vector
+		# resolve when the extension is installed into `vector_ext`. Committed so a
+		# later rollback by a caller doesn't undo it for the next checkout. Queries
+		# that depend on it also send _SET_LOCAL_SEARCH_PATH_SQL, since through a
+		# transaction pooler this session setting isn't guaranteed to apply.
+		try:
+			cur = conn.cursor()
+			# prefer vector_ext then public; if schema doesn't exist this is a no-op.
+			# The pgvector and embedding column probes ride along in the same round trip.
+			cur.execute("SET search_path = vector_ext, public; SELECT (" + _VECTOR_TYPE_EXISTS_SQL + "), (" + _EMBEDDING_COLUMN_TYPE_SQL + ")")
+			has_vector, conn.embedding_type = cur.fetchone()
+			conn.has_vector = bool(has_vector)
+			cur.close()
+			conn.commit()
+			conn.search_path_set = True
+			if conn.has_vector:
+				_HAS_VECTOR = True
+		except Exception:
+			# best-effort: if this fails, leave connection as-is and let callers handle errors
+			try:
+				conn.rollback()
+			except Exception:
+				pass
+			app.logger.debug('failed to set search_path to include vector_ext')
 	return conn
 
 
+def release_db_conn(conn) -> None:
+	"""Return a connection from get_db_conn() to the pool.
+
+	Any open transaction is rolled back by the pool and broken connections are
+	discarded. Safe to call more than once: a repeat call is ignored. A release
+	from a thread other than the one that checked the connection out is logged
+	but still honoured, so the connection and its pool slot aren't leaked.
+	"""
+	if conn is None or _DB_POOL is None:
+		return
+	owner = getattr(conn, 'owner_thread', None)
+	if owner is None:
+		return  # already released
+	if owner != threading.get_ident():
+		app.logger.warning('release_db_conn: connection checked out by thread %s released from thread %s', owner, threading.get_ident())
+	conn.owner_thread = None
+	try:
+		_DB_POOL.putconn(conn, close=bool(conn.closed))
+	except Exception:
+		pass
+	finally:
+		_DB_POOL_SLOTS.release()
+
+
+# Keys the various storage3/supabase-py versions use for public and signed URLs
+_URL_KEYS = ('publicURL', 'public_url', 'publicUrl', 'signedURL', 'signed_url', 'signedUrl', 'url')
+_URL_PLACEHOLDERS = frozenset(('not_found', 'none', 'null', ''))
+
+
 def normalize_public_url(pu) -> str:
 	"""Normalize Supabase storage URL results into a usable string.
 
@@ -167,7 +451,7 @@ def normalize_public_url(pu) -> str:
 		return ''
 	# If SDK returns a dict, try common keys for public/signed URLs
 	if isinstance(pu, dict):
-		for key in ('publicURL', 'public_url', 'publicUrl', 'signedURL', 'signed_url', 'signedUrl', 'url'):
+		for key in _URL_KEYS:
 			v = pu.get(key)
 			if v:
 				pu = v
@@ -186,32 +470,102 @@ def normalize_public_url(pu) -> str:
 		s = s[:-1].rstrip()
 
 	# Guard against placeholder strings
-	if s.lower() in ('not_found', 'none', 'null', ''):
+	if s.lower() in _URL_PLACEHOLDERS:
 		return ''
 
 	return s
 
 
-def decode_base64_image(data_url: str) -> Tuple[np.ndarray, bytes]:
-	if ',' not in data_url:
+def decode_image_bytes(img_bytes: bytes) -> np.ndarray:
+	"""Decode encoded image bytes into an RGB uint8 array.
+
+	JPEGs go through PyTurboJPEG straight to RGB when available; otherwise
+	OpenCV (libjpeg-turbo) decodes into a numpy buffer, and PIL is the fallback
+	for formats OpenCV cannot read. EXIF orientation is ignored on every path so
+	the pixel layout (and recorded width/height) doesn't depend on the decoder.
+	"""
+	if _turbojpeg is not None and img_bytes[:2] == b'\xff\xd8':
+		try:
+			return _turbojpeg.decode(img_bytes, pixel_format=TJPF_RGB)
+		except Exception:
+			app.logger.debug('turbojpeg decode failed, falling back to OpenCV')
+	bgr = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+	if bgr is not None:
+		# swap channels in place rather than allocating a second full-size buffer
+		return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=bgr)
+	img = Image.open(io.BytesIO(img_bytes))
+	if img.mode != 'RGB':
+		img = img.convert('RGB')
+	return np.array(img)
+
+
+def decode_base64_image(data_url) -> Tuple[np.ndarray, bytes]:
+	"""Decode a `data:<mime>;base64,<payload>` URL (str or bytes) into (RGB array, raw bytes)."""
+	comma = data_url.find(b',' if isinstance(data_url, (bytes, bytearray)) else ',')
+	if comma < 0:
 		raise ValueError('invalid data URL')
-	_, b64 = data_url.split(',', 1)
-	img_bytes = base64.b64decode(b64)
-	img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-	arr = np.array(img)
-	return arr, img_bytes
+	img_bytes = _b64decode(data_url[comma + 1:], validate=False)
+	return decode_image_bytes(img_bytes), img_bytes
+
+
+def uploaded_image_bytes() -> Optional[bytes]:
+	"""Raw image bytes sent without base64: the whole body for an
+	`application/octet-stream` / `image/*` request, or a multipart upload in a
+	`file`, `face_image` or `image` field. None when the image isn't sent that way.
+
+	Lets clients post the JPEG itself instead of a base64 data URL, skipping the
+	encode/decode round trip and the ~33% size overhead.
+	"""
+	mimetype = request.mimetype or ''
+	if mimetype == 'application/octet-stream' or mimetype.startswith('image/'):
+		return request.get_data(cache=False) or None
+	for key in ('file', 'face_image', 'image'):
+		f = request.files.get(key)
+		if f is not None:
+			return f.read()
+	return None
+
+
+# Copies of every processed upload are written to DEBUG_DIR only when asked for
+# (SAVE_DEBUG_IMAGES=1) or when Flask runs in debug mode.
+SAVE_DEBUG_IMAGES = coerce_bool(os.getenv('SAVE_DEBUG_IMAGES'))
+
+# Debug JPEGs are written by a background thread so requests never wait on the
+# encoder or the disk; when the queue is full new images are simply dropped.
+_DEBUG_QUEUE: 'queue.Queue[Tuple[str, np.ndarray]]' = queue.Queue(maxsize=128)
+_DEBUG_WRITER = None
+_DEBUG_WRITER_LOCK = threading.Lock()
+
+
+def _debug_image_writer() -> None:
+	while True:
+		prefix, img_arr = _DEBUG_QUEUE.get()
+		try:
+			name = f"{prefix}_{uuid.uuid4().hex}.jpg"
+			bgr = cv2.cvtColor(img_arr, cv2.COLOR_RGB2BGR)
+			cv2.imwrite(os.path.join(DEBUG_DIR, name), bgr, [cv2.IMWRITE_JPEG_QUALITY, 75])
+		except Exception:
+			app.logger.exception('failed to persist debug image')
 
 
 def save_debug_image(prefix: str, img_arr) -> None:
+	global _DEBUG_WRITER
+	if not (SAVE_DEBUG_IMAGES or app.debug):
+		return
+	# Started lazily so it lives in the serving process (not a pre-fork parent).
+	if _DEBUG_WRITER is None or not _DEBUG_WRITER.is_alive():
+		with _DEBUG_WRITER_LOCK:
+			if _DEBUG_WRITER is None or not _DEBUG_WRITER.is_alive():
+				_DEBUG_WRITER = threading.Thread(target=_debug_image_writer, name='debug-image-writer', daemon=True)
+				_DEBUG_WRITER.start()
 	try:
-		name = f"{prefix}_{uuid.uuid4().hex}.jpg"
-		Image.fromarray(img_arr).save(os.path.join(DEBUG_DIR, name))
-	except Exception:
-		app.logger.exception('failed to persist debug image')
+		_DEBUG_QUEUE.put_nowait((prefix, img_arr))
+	except queue.Full:
+		app.logger.debug('debug image queue full, dropping %s image', prefix)
 
 
 def ensure_storage_ready():
-	if not sb or not SUPABASE_BUCKET:
+	if not _STORAGE_READY:
 		raise RuntimeError('Supabase storage not configured; check SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, SUPABASE_BUCKET')
 
 
@@ -220,14 +574,13 @@ def _public_or_signed_url(path: str) -> str:
 	# First try public URL returned by the SDK
 	try:
 		pu = sb.storage.from_(SUPABASE_BUCKET).get_public_url(path)
-		app.logger.debug('get_public_url raw response: %r', pu)
 		url = normalize_public_url(pu)
-		app.logger.debug('normalized public url: %s', url)
+		if app.logger.isEnabledFor(logging.DEBUG):
+			app.logger.debug('get_public_url raw response: %r -> %s', pu, url)
 		if url:
 			# perform a lightweight HEAD check to ensure URL is reachable
 			try:
-				import requests
-				resp = requests.head(url, allow_redirects=True, timeout=5)
+				resp = http_session.head(url, allow_redirects=True, timeout=5)
 				if resp.status_code in (200, 206):
 					return url
 				app.logger.debug('public url HEAD returned %s, falling back to signed url', resp.status_code)
@@ -241,9 +594,9 @@ def _public_or_signed_url(path: str) -> str:
 	# Fallback: create a long-lived signed URL using the service role key
 	try:
 		signed = sb.storage.from_(SUPABASE_BUCKET).create_signed_url(path, 60 * 60 * 24 * 365)  # 1 year
-		app.logger.debug('create_signed_url raw response: %r', signed)
 		url = normalize_public_url(signed)
-		app.logger.debug('normalized signed url: %s', url)
+		if app.logger.isEnabledFor(logging.DEBUG):
+			app.logger.debug('create_signed_url raw response: %r -> %s', signed, url)
 		if url:
 			return url
 	except Exception:
@@ -252,38 +605,97 @@ def _public_or_signed_url(path: str) -> str:
 	return ''
 
 
-def save_image_to_storage(path: str, img_bytes: bytes) -> str:
-	ensure_storage_ready()
+class StoredImage(NamedTuple):
+	"""Encoded bytes as written to storage, with what user_images records about them."""
+	data: bytes
+	mime_type: str
+	ext: str
+	width: int
+	height: int
+
+
+def _image_mime(img_bytes: bytes) -> Tuple[str, str]:
+	"""(mime type, extension) sniffed from the magic bytes; JPEG when unrecognised."""
+	if img_bytes[:4] == b'RIFF' and img_bytes[8:12] == b'WEBP':
+		return 'image/webp', 'webp'
+	if img_bytes[:8] == b'\x89PNG\r\n\x1a\n':
+		return 'image/png', 'png'
+	return 'image/jpeg', 'jpg'
+
+
+def preview_data_url(image: StoredImage) -> str:
+	"""Inline data URL of the stored image for immediate client preview."""
+	return f'data:{image.mime_type};base64,' + binascii.b2a_base64(image.data, newline=False).decode('ascii')
+
+
+def stored_image_info(img_arr, img_bytes: bytes) -> StoredImage:
+	"""Describe bytes that are already in storage (e.g. a temp upload) as-is."""
+	mime_type, ext = _image_mime(img_bytes)
+	return StoredImage(img_bytes, mime_type, ext, img_arr.shape[1], img_arr.shape[0])
+
+
+def prepare_for_storage(img_arr, img_bytes: bytes) -> StoredImage:
+	"""Bytes to upload for a decoded image, per STORAGE_FORMAT.
+
+	For `webp` the image is capped at STORAGE_MAX_SIDE and re-encoded; the
+	original bytes are kept when they need no resize and are already smaller,
+	or when WebP encoding isn't available.
+	"""
+	if STORAGE_FORMAT != 'webp':
+		return stored_image_info(img_arr, img_bytes)
+	h, w = img_arr.shape[:2]
+	arr = img_arr
+	longest = max(h, w)
+	if STORAGE_MAX_SIDE > 0 and longest > STORAGE_MAX_SIDE:
+		scale = STORAGE_MAX_SIDE / float(longest)
+		arr = cv2.resize(img_arr, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
 	try:
-		# storage3 upload expects file bytes; avoid passing boolean values in file options
-		resp = sb.storage.from_(SUPABASE_BUCKET).upload(path, img_bytes)
-		app.logger.info('storage.upload response: %r', resp)
-		url = _public_or_signed_url(path)
-		app.logger.info('save_image_to_storage resolved url: %s for path: %s', url, path)
-		return url
-	except Exception as exc:
-		app.logger.exception('storage upload failed: %s', exc)
-		try:
-			url = _public_or_signed_url(path)
-			if url:
-				return url
-		except Exception:
-			pass
-		import tempfile
+		ok, buf = cv2.imencode('.webp', cv2.cvtColor(arr, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_WEBP_QUALITY, STORAGE_WEBP_QUALITY])
+	except cv2.error:
+		app.logger.warning('webp encoding unavailable, storing original bytes')
+		ok = False
+	if not ok or (arr is img_arr and buf.nbytes >= len(img_bytes)):
+		return stored_image_info(img_arr, img_bytes)
+	return StoredImage(buf.tobytes(), 'image/webp', 'webp', arr.shape[1], arr.shape[0])
+
+
+# Upload attempts per object; retries back off 0.25s, 0.5s, ...
+STORAGE_UPLOAD_ATTEMPTS = 3
 
-		tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
+
+def _is_transient_storage_error(exc: Exception) -> bool:
+	"""True unless storage3 reported a definite client error (4xx other than 409/429)."""
+	detail = exc.args[0] if exc.args else None
+	if not isinstance(detail, dict):
+		return True
+	try:
+		status = int(detail.get('statusCode') or detail.get('status_code') or 0)
+	except (TypeError, ValueError):
+		return True
+	return not (400 <= status < 500) or status in (409, 429)
+
+
+def save_image_to_storage(path: str, img_bytes: bytes, content_type: str = 'image/jpeg') -> str:
+	ensure_storage_ready()
+	bucket = sb.storage.from_(SUPABASE_BUCKET)
+	# storage3 upload expects file bytes; avoid passing boolean values in file options
+	file_options = {'content-type': content_type}
+	for attempt in range(STORAGE_UPLOAD_ATTEMPTS):
 		try:
-			tmp_file.write(img_bytes)
-			tmp_file.flush()
-			tmp_file.close()
-			with open(tmp_file.name, 'rb') as handle:
-				sb.storage.from_(SUPABASE_BUCKET).upload(path, handle.read())
-			return _public_or_signed_url(path)
-		finally:
-			try:
-				os.unlink(tmp_file.name)
-			except Exception:
-				pass
+			resp = bucket.upload(path, img_bytes, file_options=file_options)
+			break
+		except Exception as exc:
+			if attempt + 1 >= STORAGE_UPLOAD_ATTEMPTS or not _is_transient_storage_error(exc):
+				app.logger.exception('storage upload failed: %s', exc)
+				raise
+			app.logger.warning('storage upload attempt %d failed, retrying: %s', attempt + 1, exc)
+			time.sleep(0.25 * (2 ** attempt))
+			# upsert so a previous attempt that landed server-side doesn't conflict
+			file_options = {'content-type': content_type, 'upsert': 'true'}
+	app.logger.info('storage.upload response: %r', resp)
+	url = _public_or_signed_url(path)
+	app.logger.info('save_image_to_storage resolved url: %s for path: %s', url, path)
+	return url
 
 
 def download_from_storage(path: str) -> bytes:
@@ -300,56 +712,201 @@ def download_from_storage(path: str) -> bytes:
 	url = normalize_public_url(pu)
 	if not url:
 		raise RuntimeError('unable to retrieve file from storage')
-	import requests
-
-	resp = requests.get(url, timeout=30)
+	resp = http_session.get(url, timeout=30)
 	resp.raise_for_status()
 	return resp.content
 
 
-def compute_face_encoding(img_arr):
-	"""Compute face encoding. Returns None if face_recognition unavailable or no face detected."""
+def remove_from_storage(paths) -> list:
+	"""Delete `paths` from the bucket and return the ones that were removed.
+
+	All paths go in one Storage API call; only if that call fails are they
+	retried one by one. Objects that don't exist are not reported as removed.
+	"""
+	paths = [p for p in paths if p]
+	if not (_STORAGE_READY and paths):
+		return []
+	bucket = sb.storage.from_(SUPABASE_BUCKET)
 	try:
-		import face_recognition
-	except Exception as exc:
-		app.logger.warning('face_recognition not available: %s', str(exc))
-		return None     
+		res = bucket.remove(paths)
+	except Exception:
+		app.logger.warning('batch storage remove failed, retrying %d paths individually', len(paths), exc_info=True)
+	else:
+		return _removed_paths(res, paths)
+	removed = []
+	for p in paths:
+		try:
+			removed.extend(_removed_paths(bucket.remove([p]), [p]))
+		except Exception:
+			app.logger.exception('failed to remove storage path: %s', p)
+	return removed
+
+
+def _removed_paths(res, paths) -> list:
+	# storage3 returns the deleted objects' rows; older clients return other
+	# shapes, in which case a call that didn't raise is taken as success
+	if not isinstance(res, list):
+		return list(paths)
+	names = {item.get('name') for item in res if isinstance(item, dict)}
+	return [p for p in paths if p in names]
+
+
+def download_for_matching(path: str) -> bytes:
+	"""Download an image that only feeds face matching (nothing is persisted from it).
+
+	With STORAGE_TRANSFORM_MAX_SIDE set, ask Supabase's image transformation
+	service for a copy resized to fit that box, cutting egress and decode time;
+	otherwise, or if the transform fails, fetch the original.
+	"""
+	if STORAGE_TRANSFORM_MAX_SIDE > 0:
+		ensure_storage_ready()
+		transform = {
+			'width': STORAGE_TRANSFORM_MAX_SIDE,
+			'height': STORAGE_TRANSFORM_MAX_SIDE,
+			'resize': 'contain',
+			'quality': 85,
+		}
+		try:
+			data = sb.storage.from_(SUPABASE_BUCKET).download(path, {'transform': transform})
+			if isinstance(data, (bytes, bytearray)) and data:
+				return bytes(data)
+		except Exception:
+			app.logger.debug('transformed download failed for %s, fetching original', path)
+	return download_from_storage(path)
+
+
+def load_image(src: str) -> Tuple[np.ndarray, bytes]:
+	"""Fetch and decode an image given as an HTTP(S) URL, a data URL or a storage path.
+
+	Storage paths are downloaded with the service key (which also covers private
+	buckets); anything that isn't retrievable is finally tried as bare base64.
+	Returns (RGB array, encoded bytes).
+	"""
+	if src.startswith(('http://', 'https://')):
+		resp = http_session.get(src, timeout=20)
+		resp.raise_for_status()
+		img_bytes = resp.content
+		return decode_image_bytes(img_bytes), img_bytes
+	if src.startswith('data:'):
+		return decode_base64_image(src)
+	try:
+		img_bytes = download_from_storage(src)
+	except Exception:
+		return decode_base64_image(src)
+	return decode_image_bytes(img_bytes), img_bytes
+
+
+# Recently uploaded temp images, keyed by storage path, so register/login can
+# reuse the bytes /api/upload_face_temp just received instead of downloading
+# them back from storage. Per-process; a miss simply falls back to storage.
+UPLOAD_CACHE_TTL = 300
+UPLOAD_CACHE_MAX_ITEMS = 64
+_UPLOAD_CACHE: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+_UPLOAD_CACHE_LOCK = threading.Lock()
+
+
+def cache_temp_upload(path: str, img_bytes: bytes) -> None:
+	key = path.lstrip('/')
+	with _UPLOAD_CACHE_LOCK:
+		_UPLOAD_CACHE[key] = (time.monotonic() + UPLOAD_CACHE_TTL, img_bytes)
+		_UPLOAD_CACHE.move_to_end(key)
+		while len(_UPLOAD_CACHE) > UPLOAD_CACHE_MAX_ITEMS:
+			_UPLOAD_CACHE.popitem(last=False)
+
+
+def read_temp_upload(path: str, for_matching: bool = False) -> bytes:
+	"""Bytes of a temp upload: from the recent-upload cache if fresh, else from storage.
+
+	`for_matching` allows a server-side resized download (see download_for_matching).
+	"""
+	key = path.lstrip('/')
+	with _UPLOAD_CACHE_LOCK:
+		entry = _UPLOAD_CACHE.get(key)
+		if entry is not None:
+			if entry[0] > time.monotonic():
+				return entry[1]
+			del _UPLOAD_CACHE[key]
+	if for_matching:
+		return download_for_matching(path)
+	return download_from_storage(path)
+
+
+def _downscale_for_detection(img_arr) -> Tuple[np.ndarray, float]:
+	"""Return a copy of `img_arr` capped at FACE_DETECT_MAX_SIDE and the scale applied."""
+	h, w = img_arr.shape[:2]
+	longest = max(h, w)
+	if FACE_DETECT_MAX_SIDE <= 0 or longest <= FACE_DETECT_MAX_SIDE:
+		return img_arr, 1.0
+	scale = FACE_DETECT_MAX_SIDE / float(longest)
+	small = cv2.resize(img_arr, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+	return small, scale
+
+
+def _rescale_locations(locations, scale: float, shape) -> list:
+	"""Map (top, right, bottom, left) boxes found on a downscaled image back to `shape`."""
+	if scale == 1.0:
+		return list(locations)
+	h, w = shape[:2]
+	out = []
+	for t, r, b, l in locations:
+		out.append((
+			max(0, int(round(t / scale))),
+			min(w, int(round(r / scale))),
+			min(h, int(round(b / scale))),
+			max(0, int(round(l / scale))),
+		))
+	return out
+
+
+def compute_face_encoding(img_arr, num_jitters: int = 1):
+	"""Compute face encoding. Returns None if face_recognition unavailable or no face detected.
+
+	`num_jitters` > 1 averages that many randomly perturbed encodings: steadier
+	enrollment vectors at a proportional CPU cost. Login queries keep the default 1.
+	"""
+	if face_recognition is None:
+		app.logger.warning('face_recognition not available: %s', FACE_RECOGNITION_ERROR)
+		return None
 	# Log image details for debugging
 	app.logger.debug('face detection: image shape %s, dtype %s', img_arr.shape, img_arr.dtype)
-	print(f'compute_face_encoding: image shape={getattr(img_arr, "shape", None)}', flush=True)
-	# Fast path: prefer the lightweight `hog` detector with minimal upsampling
-	# and low jitter for encoding. If hog finds no faces, fall back to cnn.
-	
+	# Fast path: use the configured detector (`hog` on CPU, `cnn` on CUDA dlib)
+	# with minimal upsampling and low jitter for encoding. If it finds no faces,
+	# fall back to cnn with one upsample.
+
+	# Detection cost scales with pixel count, so locate faces on a downscaled copy
+	# and map the boxes back; the encoder below still sees the full-res crop.
+	small_arr, scale = _downscale_for_detection(img_arr)
 	locations = []
 	try:
-		locations = face_recognition.face_locations(img_arr, model='hog', number_of_times_to_upsample=0)
+		locations = face_recognition.face_locations(small_arr, model=FACE_DETECTOR_MODEL, number_of_times_to_upsample=0)
 	except Exception:
 		try:
-			locations = face_recognition.face_locations(img_arr)
+			locations = face_recognition.face_locations(small_arr)
 		except Exception:
 			locations = []
 
-	app.logger.debug('face detection (fast/hog) found %d locations', len(locations))
+	app.logger.debug('face detection (fast/%s) found %d locations', FACE_DETECTOR_MODEL, len(locations))
 
-	# If no faces found with hog, try cnn once with a small upsample for accuracy
+	# If no faces found on the fast pass, try cnn once with a small upsample for accuracy
 	if not locations:
 		try:
-			locations = face_recognition.face_locations(img_arr, model='cnn', number_of_times_to_upsample=1)
+			locations = face_recognition.face_locations(small_arr, model='cnn', number_of_times_to_upsample=1)
 		except Exception:
 			try:
-				locations = face_recognition.face_locations(img_arr)
+				locations = face_recognition.face_locations(small_arr)
 			except Exception:
 				locations = []
 
 	app.logger.debug('face detection: final locations count %d', len(locations))
 	if not locations:
 		return None
+	locations = _rescale_locations(locations, scale, img_arr.shape)
 
 	# Compute encodings with minimal jitter to speed up processing.
 	encodings = []
 	try:
-		# Many builds accept `known_face_locations` and `num_jitters`; use low jitter (1)
-		encodings = face_recognition.face_encodings(img_arr, known_face_locations=locations, num_jitters=1)
+		# Many builds accept `known_face_locations` and `num_jitters`
+		encodings = face_recognition.face_encodings(img_arr, known_face_locations=locations, num_jitters=num_jitters)
 	except TypeError:
 		try:
 			encodings = face_recognition.face_encodings(img_arr, locations)
@@ -364,42 +921,152 @@ def compute_face_encoding(img_arr):
 	return encodings[0]
 
 
-def insert_embedding(cur, user_id: str, encoding, source: str) -> None:
-	# Detect vector availability using a separate connection (cached).
-	has_vector = _detect_vector_type()
-
-	# Prefer inserting as PostgreSQL float8[] which works even when pgvector
-	# extension isn't installed. If that fails and `vector` type is available,
-	# fall back to the ::vector cast.
-	list_vals = list(float(x) for x in encoding)
-	sql_array = """
-		INSERT INTO public.embeddings (user_id, embedding, source, created_at)
-		VALUES (%s, %s, %s, now())
-	"""
-	try:
-		app.logger.debug('insert_embedding: attempting float8[] insert, user=%s length=%d', user_id, len(encoding))
-		app.logger.debug('insert_embedding: sql=%s params=%s', sql_array.strip(), '[<list float>]')
-		cur.execute(sql_array, (user_id, list_vals, source))
+# Recent encodings keyed by a BLAKE2b digest of the encoded image bytes (and the
+# jitter count), so a retried upload or a temp image reused across
+# upload -> register/login skips dlib entirely. "No face" results are cached too.
+ENCODING_CACHE_MAX_ITEMS = 512
+_ENCODING_CACHE: 'OrderedDict[Tuple[bytes, int], Optional[np.ndarray]]' = OrderedDict()
+_ENCODING_CACHE_LOCK = threading.Lock()
+
+
+def cached_face_encoding(img_bytes: bytes, img_arr, num_jitters: int = 1):
+	"""compute_face_encoding for `img_arr`, memoised on the bytes it was decoded from."""
+	key = (hashlib.blake2b(img_bytes, digest_size=16).digest(), num_jitters)
+	with _ENCODING_CACHE_LOCK:
+		if key in _ENCODING_CACHE:
+			_ENCODING_CACHE.move_to_end(key)
+			return _ENCODING_CACHE[key]
+	encoding = compute_face_encoding(img_arr, num_jitters)
+	if face_recognition is not None:
+		with _ENCODING_CACHE_LOCK:
+			_ENCODING_CACHE[key] = encoding
+			while len(_ENCODING_CACHE) > ENCODING_CACHE_MAX_ITEMS:
+				_ENCODING_CACHE.popitem(last=False)
+	return encoding
+
+
+def _warm_face_models() -> None:
+	"""Run one tiny detection + encoding so dlib's lazy setup happens at boot."""
+	if face_recognition is None:
 		return
+	try:
+		dummy = np.zeros((80, 80, 3), dtype=np.uint8)
+		face_recognition.face_locations(dummy, model=FACE_DETECTOR_MODEL, number_of_times_to_upsample=0)
+		face_recognition.face_encodings(dummy, known_face_locations=[(10, 70, 70, 10)], num_jitters=1)
+		app.logger.info('face models warmed up (detector=%s)', FACE_DETECTOR_MODEL)
 	except Exception:
-		app.logger.exception('insert_embedding: float8[] insert failed, will try vector cast if available')
+		app.logger.exception('face model warm-up failed')
+
+
+def to_vector_text(encoding) -> str:
+	"""Format an encoding as pgvector's text input form, e.g. '[0.1,0.2,...]'."""
+	if orjson is not None:
+		# orjson serialises the array in C using shortest round-trip floats, and a
+		# JSON number array is already valid pgvector input.
+		arr = np.ascontiguousarray(encoding, dtype=np.float64)
+		return orjson.dumps(arr, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+	# tolist() converts all 128 values to Python floats in C; map(repr) then skips
+	# the per-element generator frame and float() call.
+	return '[' + ','.join(map(repr, np.asarray(encoding, dtype=np.float64).tolist())) + ']'
 
-	if has_vector:
+
+# Column types that take embeddings as pgvector text; a float8[] column (or one
+# not probed yet) gets a plain array, which pgvector columns also assignment-cast.
+_VECTOR_COLUMN_TYPES = frozenset(('vector', 'halfvec'))
+
+
+def embedding_param(cur, encoding, alternate: bool = False) -> Tuple[str, object]:
+	"""Placeholder and bound value for `encoding`, matching the embedding column type.
+
+	`alternate` returns the other form (array <-> vector text), for a retry after
+	the matching form was rejected.
+	"""
+	if (getattr(cur.connection, 'embedding_type', None) in _VECTOR_COLUMN_TYPES) != alternate:
+		return '%s::vector', to_vector_text(encoding)
+	# ndarray.tolist() converts all 128 values in one C call.
+	return '%s', np.asarray(encoding, dtype=np.float64).tolist()
+
+
+# Statements that cast to vector or use its operators re-apply the search_path
+# transaction-locally in the same batch: behind Supabase's transaction pooler
+# (port 6543) the session-level SET from get_db_conn() may have been issued on
+# a different server connection.
+_SET_LOCAL_SEARCH_PATH_SQL = "SET LOCAL search_path = vector_ext, public;"
+
+_INSERT_EMBEDDING_SQL = _SET_LOCAL_SEARCH_PATH_SQL + """
+	INSERT INTO public.embeddings (user_id, embedding, source, created_at)
+	VALUES (%s, {embedding}, %s, now())
+"""
+
+
+def insert_embedding(cur, user_id: str, encoding, source: str, alternate: bool = False) -> None:
+	# The column type was probed when the connection was set up, so a single
+	# statement in the right form is sent instead of trying float8[] and
+	# falling back to ::vector after a failure.
+	placeholder, value = embedding_param(cur, encoding, alternate)
+	cur.execute(_INSERT_EMBEDDING_SQL.format(embedding=placeholder), (user_id, value, source))
+
+
+_INSERT_USER_IMAGE_SQL = """
+	INSERT INTO public.user_images (user_id, storage_path, public_url, width, height, mime_type, uploaded_at, is_profile, file_size)
+	VALUES (%s, %s, %s, %s, %s, %s, now(), %s, %s)
+"""
+
+# Image row + embedding in one statement. Sent together with the savepoint
+# commands as a single simple-query batch, so it costs one round trip and a
+# rejected embedding can be rolled back without losing the caller's transaction.
+_INSERT_USER_IMAGE_WITH_EMBEDDING_SQL = _SET_LOCAL_SEARCH_PATH_SQL + """
+	SAVEPOINT user_image_insert;
+	WITH img AS (
+		INSERT INTO public.user_images (user_id, storage_path, public_url, width, height, mime_type, uploaded_at, is_profile, file_size)
+		VALUES (%s, %s, %s, %s, %s, %s, now(), %s, %s)
+		RETURNING user_id
+	)
+	INSERT INTO public.embeddings (user_id, embedding, source, created_at)
+	SELECT img.user_id, {embedding}, %s, now() FROM img;
+	RELEASE SAVEPOINT user_image_insert;
+"""
+
+
+def insert_user_image(cur, user_id: str, storage_path: str, public_url: str, image: StoredImage, encoding=None, source: str = '') -> bool:
+	"""Insert a `user_images` row and, if `encoding` is given, its embedding.
+
+	Both rows normally go in one round trip. If that statement fails (typically
+	the embedding being rejected) the image row is inserted on its own and the
+	embedding is retried under a savepoint in the other parameter form (array
+	vs vector text), in case the probed column type was stale or unknown. Raises only if the image row
+	can't be stored; returns whether an embedding was stored.
+	"""
+	image_params = (
+		user_id,
+		storage_path,
+		public_url,
+		image.width,
+		image.height,
+		image.mime_type,
+		True,
+		len(image.data),
+	)
+	if encoding is not None:
 		try:
-			vec_text = '[' + ','.join(str(float(x)) for x in encoding) + ']'
-			sql_vec = """
-				INSERT INTO public.embeddings (user_id, embedding, source, created_at)
-				VALUES (%s, %s::vector, %s, now())
-			"""
-			app.logger.debug('insert_embedding: attempting ::vector insert, user=%s length=%d', user_id, len(encoding))
-			app.logger.debug('insert_embedding: sql=%s params=%s', sql_vec.strip(), '[vec_text, source]')
-			cur.execute(sql_vec, (user_id, vec_text, source))
-			return
+			placeholder, value = embedding_param(cur, encoding)
+			cur.execute(_INSERT_USER_IMAGE_WITH_EMBEDDING_SQL.format(embedding=placeholder), image_params + (value, source))
+			return True
 		except Exception:
-			app.logger.exception('insert_embedding: ::vector insert also failed')
-
-	# If we reached here, both insertion attempts failed — raise to caller
-	raise RuntimeError('embedding insert failed for all strategies')
+			app.logger.warning('insert_user_image: combined insert failed, inserting image and embedding separately', exc_info=True)
+			cur.execute('ROLLBACK TO SAVEPOINT user_image_insert')
+	cur.execute(_INSERT_USER_IMAGE_SQL, image_params)
+	if encoding is None:
+		return False
+	cur.execute('SAVEPOINT embedding_insert')
+	try:
+		insert_embedding(cur, user_id, encoding, source, alternate=True)
+		cur.execute('RELEASE SAVEPOINT embedding_insert')
+		return True
+	except Exception:
+		app.logger.exception('insert_user_image: embedding insert failed')
+		cur.execute('ROLLBACK TO SAVEPOINT embedding_insert')
+		return False
 
 
 @app.errorhandler(404)
@@ -446,59 +1113,25 @@ def api_detect_face():
 	# or a Supabase storage path (download via download_from_storage).
 	img_arr = None
 	try:
-		# HTTP(S) URL: fetch bytes via requests
-		if isinstance(data_url, str) and (data_url.startswith('http://') or data_url.startswith('https://')):
-			import requests
-			resp = requests.get(data_url, timeout=20)
-			resp.raise_for_status()
-			img_bytes = resp.content
-			from PIL import Image as PILImage
-			img = PILImage.open(io.BytesIO(img_bytes)).convert('RGB')
-			img_arr = np.array(img)
-		# Data URL (base64): decode locally
-		elif isinstance(data_url, str) and data_url.startswith('data:'):
-			img_arr, _ = decode_base64_image(data_url)
-		else:
-			# Treat input as a storage path: prefer resolving a public URL and fetching
-			# that URL so frontends can simply pass the public link. If that fails,
-			# fall back to direct download_from_storage or base64 decode.
-			fetched = False
-			if sb and SUPABASE_BUCKET:
-				try:
-					pub = _public_or_signed_url(data_url)
-					if pub:
-						import requests
-						r = requests.get(pub, timeout=20)
-						r.raise_for_status()
-						img_bytes = r.content
-						from PIL import Image as PILImage
-						img = PILImage.open(io.BytesIO(img_bytes)).convert('RGB')
-						img_arr = np.array(img)
-						fetched = True
-				except Exception:
-					fetched = False
-			if not fetched:
-				try:
-					raw = download_from_storage(data_url)
-					img_bytes = raw
-					from PIL import Image as PILImage
-					img = PILImage.open(io.BytesIO(img_bytes)).convert('RGB')
-					img_arr = np.array(img)
-				except Exception:
-					img_arr, _ = decode_base64_image(data_url)
+		img_arr, _ = load_image(data_url)
 	except Exception as exc:
 		return jsonify({'ok': False, 'error': 'bad_image', 'detail': str(exc)}), 400
 
-	try:
-		import face_recognition
-	except Exception as exc:
+	if face_recognition is None:
 		return jsonify({
 			'ok': False,
 			'error': 'face_recognition_unavailable',
 			'detail': 'face_recognition library not installed. Image upload still works but face detection disabled.'
 		}), 501
 
-	locations = face_recognition.face_locations(img_arr, model='large', number_of_times_to_upsample=2)
+	# Detect on a downscaled copy and report boxes in the original image's coordinates
+	small_arr, scale = _downscale_for_detection(img_arr)
+	# Same two-tier strategy as compute_face_encoding: the configured detector with
+	# one upsample first, escalating to cnn only when it finds nothing.
+	locations = face_recognition.face_locations(small_arr, model=FACE_DETECTOR_MODEL, number_of_times_to_upsample=1)
+	if not locations:
+		locations = face_recognition.face_locations(small_arr, model='cnn', number_of_times_to_upsample=1)
+	locations = _rescale_locations(locations, scale, img_arr.shape)
 	faces = [{'top': t, 'right': r, 'bottom': b, 'left': l} for t, r, b, l in locations]
 
 	# Read-only detect: return bounding boxes only (no DB writes).
@@ -511,11 +1144,16 @@ def api_upload_face_temp():
 	Use this if your frontend still expects a temp upload step before capture/register.
 	"""
 	payload = request.get_json(force=True) if request.is_json else request.form.to_dict()
+	file_bytes = uploaded_image_bytes()
 	data_url = payload.get('face_image') or payload.get('image')
-	if not data_url:
+	if not data_url and not file_bytes:
 		return jsonify({'ok': False, 'error': 'missing_image'}), 400
 	try:
-		img_arr, img_bytes = decode_base64_image(data_url)
+		if file_bytes:
+			img_bytes = file_bytes
+			img_arr = decode_image_bytes(img_bytes)
+		else:
+			img_arr, img_bytes = decode_base64_image(data_url)
 	except Exception as exc:
 		return jsonify({'ok': False, 'error': 'bad_image', 'detail': str(exc)}), 400
 
@@ -526,24 +1164,24 @@ def api_upload_face_temp():
 	except Exception as exc:
 		return jsonify({'ok': False, 'error': 'storage_not_configured', 'detail': str(exc)}), 500
 
-	storage_path = f"temp/{uuid.uuid4().hex}.jpg"
+	stored_img = prepare_for_storage(img_arr, img_bytes)
+	storage_path = f"temp/{uuid.uuid4().hex}.{stored_img.ext}"
 	try:
-		url = save_image_to_storage(storage_path, img_bytes)
+		url = save_image_to_storage(storage_path, stored_img.data, stored_img.mime_type)
 		if not url:
 			app.logger.warning('upload returned empty url for %s', storage_path)
 			url = storage_path
 	except Exception as exc:
 		app.logger.exception('upload_face_temp failed: %s', exc)
 		return jsonify({'ok': False, 'error': 'upload_failed', 'detail': str(exc)}), 500
+	cache_temp_upload(storage_path, stored_img.data)
 
-	# Always return a preview data URL so frontend can show image immediately
-	try:
-		preview_data_url = 'data:image/jpeg;base64,' + base64.b64encode(img_bytes).decode()
-	except Exception:
-		preview_data_url = None
+	# Return a preview data URL so the frontend can show the image immediately,
+	# unless the client opts out (`preview=false`) because it already has the bytes
+	preview_url = preview_data_url(stored_img) if coerce_bool(payload.get('preview', True)) else None
 
 	app.logger.info('upload_face_temp succeeded: path=%s url=%s', storage_path, url)
-	return jsonify({'ok': True, 'temp_storage_path': storage_path, 'public_url': url, 'preview_data_url': preview_data_url}), 200
+	return jsonify({'ok': True, 'temp_storage_path': storage_path, 'public_url': url, 'preview_data_url': preview_url}), 200
 
 
 # Legacy alias so existing frontend calls to /api/upload_face keep working
@@ -552,6 +1190,43 @@ def api_upload_face_legacy():
 	return api_upload_face_temp()
 
 
+@app.route('/api/presigned_upload', methods=['POST'])
+def api_presigned_upload():
+	"""Issue a signed upload URL for a new temp/ object so the client can PUT the
+	image straight to Supabase Storage instead of proxying the bytes through here.
+	The returned `temp_storage_path` is then passed to register / attach_image /
+	login_face like one from /api/upload_face_temp.
+	"""
+	try:
+		ensure_storage_ready()
+	except Exception as exc:
+		return jsonify({'ok': False, 'error': 'storage_not_configured', 'detail': str(exc)}), 500
+
+	storage_path = f"temp/{uuid.uuid4().hex}.jpg"
+	try:
+		resp = sb.storage.from_(SUPABASE_BUCKET).create_signed_upload_url(storage_path)
+	except Exception as exc:
+		app.logger.exception('presigned_upload failed: %s', exc)
+		return jsonify({'ok': False, 'error': 'presign_failed', 'detail': str(exc)}), 500
+
+	signed_url = normalize_public_url(resp)
+	token = resp.get('token') if isinstance(resp, dict) else None
+	if not signed_url:
+		app.logger.warning('create_signed_upload_url returned no url: %r', resp)
+		return jsonify({'ok': False, 'error': 'presign_failed'}), 500
+	return jsonify({'ok': True, 'temp_storage_path': storage_path, 'signed_url': signed_url, 'token': token}), 200
+
+
+def _discard_upload(upload_future, storage_path: str) -> None:
+	"""Remove an object uploaded for a request that then failed, so it isn't orphaned."""
+	try:
+		upload_future.result()
+	except Exception:
+		return  # nothing was stored
+	if not remove_from_storage([storage_path]):
+		app.logger.warning('failed to remove orphaned upload: %s', storage_path)
+
+
 @app.route('/api/capture_face', methods=['POST'])
 def api_capture_face():
 	payload = request.get_json(force=True) if request.is_json else request.form.to_dict()
@@ -561,130 +1236,96 @@ def api_capture_face():
 	if not data_url:
 		return jsonify({'ok': False, 'error': 'missing_image'}), 400
 
-	# Accept data URL, HTTP(S) URL, or storage path. Prefer public URL for storage paths.
+	# Accept data URL, HTTP(S) URL, or storage path.
 	try:
-		if isinstance(data_url, str) and (data_url.startswith('http://') or data_url.startswith('https://')):
-			import requests
-			resp = requests.get(data_url, timeout=20)
-			resp.raise_for_status()
-			img_bytes = resp.content
-			img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-			img_arr = np.array(img)
-		elif isinstance(data_url, str) and data_url.startswith('data:'):
-			img_arr, img_bytes = decode_base64_image(data_url)
-		else:
-			fetched = False
-			if sb and SUPABASE_BUCKET:
-				try:
-					pub = _public_or_signed_url(data_url)
-					if pub:
-						import requests
-						r = requests.get(pub, timeout=20)
-						r.raise_for_status()
-						img_bytes = r.content
-						img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-						img_arr = np.array(img)
-						fetched = True
-				except Exception:
-					fetched = False
-			if not fetched:
-				try:
-					raw = download_from_storage(data_url)
-					img_bytes = raw
-					img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-					img_arr = np.array(img)
-				except Exception:
-					img_arr, img_bytes = decode_base64_image(data_url)
+		img_arr, img_bytes = load_image(data_url)
 	except Exception as exc:
 		return jsonify({'ok': False, 'error': 'bad_image', 'detail': str(exc)}), 400
 
 	save_debug_image('capture', img_arr)
 
-	# Try to compute encoding, but allow capture even if face_recognition unavailable
-	encoding = compute_face_encoding(img_arr)
-	if encoding is None:
-		app.logger.warning('capture_face: no encoding computed (face_recognition unavailable or no face detected)')
-
 	try:
 		ensure_storage_ready()
 	except Exception as exc:
 		return jsonify({'ok': False, 'error': 'storage_not_configured', 'detail': str(exc)}), 500
 
-	# If user_id missing, create provisional user to attach face/embedding to
-	provisional_created = False
-	if not user_id:
+	# Encode on the I/O pool while the provisional user insert and the storage
+	# upload proceed; capture is allowed even if no encoding comes back.
+	encoding_future = _IO_POOL.submit(cached_face_encoding, img_bytes, img_arr, FACE_ENROLL_JITTERS)
+
+	# If user_id missing, create a provisional user to attach face/embedding to. Its
+	# id is generated here so the storage upload can start alongside the insert.
+	provisional_created = not user_id
+	if provisional_created:
+		user_id = str(uuid.uuid4())
+	stored_img = prepare_for_storage(img_arr, img_bytes)
+	filename = f"{int(time.time())}_{uuid.uuid4().hex}.{stored_img.ext}"
+	storage_path = f"{user_id}/{filename}"
+	upload_future = _IO_POOL.submit(save_image_to_storage, storage_path, stored_img.data, stored_img.mime_type)
+
+	# One pooled connection for both steps. The provisional user is committed on
+	# its own so a failed image insert never undoes it.
+	try:
 		conn = get_db_conn()
+	except Exception as exc:
+		app.logger.exception('capture_face: no db connection')
+		encoding_future.cancel()
+		_discard_upload(upload_future, storage_path)
+		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
+	cur = None
+	try:
 		cur = conn.cursor()
+		if provisional_created:
+			try:
+				temp_username = f"temp_{uuid.uuid4().hex[:8]}"
+				cur.execute(
+					"""
+						INSERT INTO public.users (id, display_name, username, email, phone, created_at, verified)
+						VALUES (%s, %s, %s, %s, %s, now(), false)
+					""",
+					(user_id, temp_username, temp_username, None, None),
+				)
+				conn.commit()
+			except Exception as exc:
+				conn.rollback()
+				app.logger.exception('provisional user create failed')
+				encoding_future.cancel()
+				_discard_upload(upload_future, storage_path)
+				return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
+
 		try:
-			temp_username = f"temp_{uuid.uuid4().hex[:8]}"
-			cur.execute(
-				"""
-					INSERT INTO public.users (display_name, username, email, phone, created_at, verified)
-					VALUES (%s, %s, %s, %s, now(), false)
-					RETURNING id
-				""",
-				(temp_username, temp_username, None, None),
-			)
-			user_id = cur.fetchone()[0]
+			public_url = upload_future.result()
+			if not public_url:
+				public_url = storage_path  # return path so client can still reference
+
+			# Image row and (when we have one) the embedding in a single round trip
+			encoding = encoding_future.result()
+			stored = insert_user_image(cur, user_id, storage_path, public_url, stored_img, encoding, 'capture')
+			if encoding is None:
+				app.logger.warning('capture_face: no encoding computed (face_recognition unavailable or no face detected)')
+			elif not stored:
+				app.logger.warning('capture_face: embedding insert failed, continuing')
 			conn.commit()
-			provisional_created = True
 		except Exception as exc:
 			conn.rollback()
-			app.logger.exception('provisional user create failed')
-			cur.close()
-			conn.close()
+			app.logger.exception('capture_face: db error')
+			_discard_upload(upload_future, storage_path)
 			return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
-		finally:
-			cur.close()
-			conn.close()
-
-	conn = get_db_conn()
-	cur = conn.cursor()
-	try:
-		filename = f"{int(time.time())}_{uuid.uuid4().hex}.jpg"
-		storage_path = f"{user_id}/{filename}"
-		public_url = save_image_to_storage(storage_path, img_bytes)
-		if not public_url:
-			public_url = storage_path  # return path so client can still reference
-
-		cur.execute(
-			"""
-				INSERT INTO public.user_images (user_id, storage_path, public_url, width, height, mime_type, uploaded_at, is_profile, file_size)
-				VALUES (%s, %s, %s, %s, %s, %s, now(), %s, %s)
-			""",
-			(
-				user_id,
-				storage_path,
-				public_url,
-				img_arr.shape[1],
-				img_arr.shape[0],
-				'image/jpeg',
-				True,
-				len(img_bytes),
-			),
-		)
-
-		# Insert embedding only if we have one
-		if encoding is not None:
-			try:
-				insert_embedding(cur, user_id, encoding, 'capture')
-			except Exception:
-				app.logger.exception('capture_face: embedding insert failed, continuing')
-		conn.commit()
 	except Exception as exc:
-		conn.rollback()
 		app.logger.exception('capture_face: db error')
+		encoding_future.cancel()
+		_discard_upload(upload_future, storage_path)
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 	finally:
-		cur.close()
-		conn.close()
+		try:
+			if cur is not None:
+				cur.close()
+		finally:
+			release_db_conn(conn)
 
-	try:
-		preview_data_url = 'data:image/jpeg;base64,' + base64.b64encode(img_bytes).decode()
-	except Exception:
-		preview_data_url = None
+	preview_url = preview_data_url(stored_img) if coerce_bool(payload.get('preview', True)) else None
 	app.logger.info('capture_face succeeded: user=%s path=%s url=%s', user_id, storage_path, public_url)
-	return jsonify({'ok': True, 'profile_image_url': public_url, 'storage_path': storage_path, 'preview_data_url': preview_data_url}), 201
+	return jsonify({'ok': True, 'profile_image_url': public_url, 'storage_path': storage_path, 'preview_data_url': preview_url}), 201
 
 
 
@@ -741,15 +1382,35 @@ def api_register():
 	accessibility_needs = payload.get('accessibility_needs')
 	preferred_language = payload.get('preferred_language')
 
-	conn = get_db_conn()
-	cur = conn.cursor()
-	try:
-		# Use psycopg2 Json wrapper for jsonb columns
+	# Decode any supplied image before the users insert so the face encoding can
+	# run on the I/O pool meanwhile. Image errors never block registration.
+	file_bytes = uploaded_image_bytes()
+	image_data_url = payload.get('image') or payload.get('face_image') or payload.get('image_url')
+	temp_path = payload.get('temp_storage_path') or payload.get('temp_path')
+	img_arr = img_bytes = encoding_future = None
+	if file_bytes or image_data_url or temp_path:
 		try:
-			from psycopg2.extras import Json
+			if file_bytes:
+				img_bytes = file_bytes
+				img_arr = decode_image_bytes(img_bytes)
+				temp_path = None
+			elif image_data_url:
+				img_arr, img_bytes = load_image(image_data_url)
+			else:
+				# download the temp file from storage and reuse its storage path (do NOT re-upload)
+				raw = read_temp_upload(temp_path)
+				img_bytes = raw
+				img_arr = decode_image_bytes(img_bytes)
+
+			encoding_future = _IO_POOL.submit(cached_face_encoding, img_bytes, img_arr, FACE_ENROLL_JITTERS)
 		except Exception:
-			Json = lambda x: json.dumps(x) if x is not None else None
+			img_arr = None
+			app.logger.exception('register: image handling failed')
 
+	conn = cur = None
+	try:
+		conn = get_db_conn()
+		cur = conn.cursor()
 		cur.execute(
 			"""
 				INSERT INTO public.users (
@@ -785,97 +1446,69 @@ def api_register():
 		user_id = cur.fetchone()[0]
 		conn.commit()
 	except Exception as exc:
-		conn.rollback()
+		if conn is not None:
+			try:
+				conn.rollback()
+			except Exception:
+				pass
 		app.logger.exception('register: db error')
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 	finally:
-		cur.close()
-		conn.close()
-
-	# If the client provided an image data URL or temp path, attach it to the user and insert embedding
-	image_data_url = payload.get('image') or payload.get('face_image') or payload.get('image_url')
-	temp_path = payload.get('temp_storage_path') or payload.get('temp_path')
-	if image_data_url or temp_path:
 		try:
-			if image_data_url:
-				# Accept data URL, HTTP(S) URL, or storage path
-				if isinstance(image_data_url, str) and (image_data_url.startswith('http://') or image_data_url.startswith('https://')):
-					import requests
-					resp = requests.get(image_data_url, timeout=20)
-					resp.raise_for_status()
-					img_bytes = resp.content
-					img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-					img_arr = np.array(img)
-				elif isinstance(image_data_url, str) and image_data_url.startswith('data:'):
-					img_arr, img_bytes = decode_base64_image(image_data_url)
-				else:
-					# treat as storage path
-					try:
-						raw = download_from_storage(image_data_url)
-						img_bytes = raw
-						img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-						img_arr = np.array(img)
-					except Exception:
-						img_arr, img_bytes = decode_base64_image(image_data_url)
-			else:
-				# download the temp file from storage and reuse its storage path (do NOT re-upload)
-				raw = download_from_storage(temp_path)
-				img_bytes = raw
-				from PIL import Image as PILImage
-				import numpy as np
-				img = PILImage.open(io.BytesIO(img_bytes)).convert('RGB')
-				img_arr = np.array(img)
+			if cur is not None:
+				cur.close()
+		finally:
+			if conn is not None:
+				release_db_conn(conn)
 
+	# If the client provided an image, attach it to the user and insert embedding
+	if img_arr is not None:
+		try:
 			save_debug_image('register', img_arr)
-			conn = get_db_conn()
-			cur = conn.cursor()
+			# If the frontend provided a temp storage path, keep that path (e.g. "Registration/...")
+			# rather than re-uploading into a new user-specific folder.
+			if temp_path:
+				# normalize path and avoid leading slashes
+				storage_path = temp_path.lstrip('/')
+				stored_img = stored_image_info(img_arr, img_bytes)
+				url_future = _IO_POOL.submit(_public_or_signed_url, storage_path)
+			else:
+				# fallback: create user folder and upload
+				stored_img = prepare_for_storage(img_arr, img_bytes)
+				filename = f"{int(time.time())}_{uuid.uuid4().hex}.{stored_img.ext}"
+				storage_path = f"{user_id}/{filename}"
+				url_future = _IO_POOL.submit(save_image_to_storage, storage_path, stored_img.data, stored_img.mime_type)
+			# Storage I/O and the encoding run concurrently on the pool; the DB work
+			# stays on this thread since pooled connections are owned per thread.
+			public_url = url_future.result() or storage_path
+			encoding = encoding_future.result()
+			conn = cur = None
 			try:
-				# If the frontend provided a temp storage path, keep that path (e.g. "Registration/...")
-				# rather than re-uploading into a new user-specific folder. We still download
-				# the object to compute dimensions and embeddings.
-				if temp_path:
-					# normalize path and avoid leading slashes
-					storage_path = temp_path.lstrip('/')
-					public_url = _public_or_signed_url(storage_path) or storage_path
+				conn = get_db_conn()
+				cur = conn.cursor()
+				# Embedding is optional - registration succeeds even without face encoding
+				stored = insert_user_image(cur, user_id, storage_path, public_url, stored_img, encoding, 'register')
+				if stored:
+					app.logger.info('register: embedding inserted successfully')
+				elif encoding is None:
+					app.logger.warning('register: no encoding computed (face_recognition unavailable or no face)')
 				else:
-					# fallback: create user folder and upload
-					filename = f"{int(time.time())}_{uuid.uuid4().hex}.jpg"
-					storage_path = f"{user_id}/{filename}"
-					public_url = save_image_to_storage(storage_path, img_bytes) or storage_path
-				cur.execute(
-					"""
-						INSERT INTO public.user_images (user_id, storage_path, public_url, width, height, mime_type, uploaded_at, is_profile, file_size)
-						VALUES (%s, %s, %s, %s, %s, %s, now(), %s, %s)
-					""",
-					(
-						user_id,
-						storage_path,
-						public_url,
-						img_arr.shape[1],
-						img_arr.shape[0],
-						'image/jpeg',
-						True,
-						len(img_bytes),
-					),
-				)
-				# Try to compute encoding and insert embedding separately
-				# This is optional - registration succeeds even without face encoding
-				encoding = compute_face_encoding(img_arr)
-				if encoding is not None:
+					app.logger.warning('register: failed to insert embedding, continuing')
+				conn.commit()
+			except Exception:
+				if conn is not None:
 					try:
-						insert_embedding(cur, user_id, encoding, 'register')
-						app.logger.info('register: embedding inserted successfully')
+						conn.rollback()
 					except Exception:
-						app.logger.warning('register: failed to insert embedding, continuing')
-				else:
-					app.logger.warning('register: no encoding computed (face_recognition unavailable or no face)')
-				conn.commit()
-			except Exception as exc:
-				conn.rollback()
+						pass
 				app.logger.exception('register: failed to attach image')
 			finally:
-				cur.close()
-				conn.close()
+				try:
+					if cur is not None:
+						cur.close()
+				finally:
+					if conn is not None:
+						release_db_conn(conn)
 		except Exception:
 			app.logger.exception('register: image handling failed')
 
@@ -906,72 +1539,34 @@ def api_attach_image():
 
 	try:
 		if data_url:
-			# Accept HTTP(S) URL, data URL, or treat as storage path. Prefer public URL.
-			if isinstance(data_url, str) and (data_url.startswith('http://') or data_url.startswith('https://')):
-				import requests
-				r = requests.get(data_url, timeout=20)
-				r.raise_for_status()
-				img_bytes = r.content
-				img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-				img_arr = np.array(img)
-			elif isinstance(data_url, str) and data_url.startswith('data:'):
-				img_arr, img_bytes = decode_base64_image(data_url)
-			else:
-				fetched = False
-				if sb and SUPABASE_BUCKET:
-					try:
-						pub = _public_or_signed_url(data_url)
-						if pub:
-							import requests
-							r = requests.get(pub, timeout=20)
-							r.raise_for_status()
-							img_bytes = r.content
-							img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-							img_arr = np.array(img)
-							fetched = True
-					except Exception:
-						fetched = False
-				if not fetched:
-					try:
-						raw = download_from_storage(data_url)
-						img_bytes = raw
-						img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-						img_arr = np.array(img)
-					except Exception:
-						img_arr, img_bytes = decode_base64_image(data_url)
+			img_arr, img_bytes = load_image(data_url)
 		else:
-			raw = download_from_storage(temp_path)
+			raw = read_temp_upload(temp_path)
 			img_bytes = raw
-			from PIL import Image as PILImage
-			import numpy as np
-			img = PILImage.open(io.BytesIO(img_bytes)).convert('RGB')
-			img_arr = np.array(img)
+			img_arr = decode_image_bytes(img_bytes)
 
 		save_debug_image('attach', img_arr)
 
-		# Insert user_images in its own transaction
+		# Encode on the I/O pool while the upload runs here
+		encoding_future = _IO_POOL.submit(cached_face_encoding, img_bytes, img_arr, FACE_ENROLL_JITTERS)
+
+		# Insert user_images (plus the embedding, in the same round trip) in its own
+		# transaction; a rejected embedding never rolls back the image row.
+		img_conn = img_cur = None
 		try:
+			stored_img = prepare_for_storage(img_arr, img_bytes)
+			filename = f"{int(time.time())}_{uuid.uuid4().hex}.{stored_img.ext}"
+			storage_path = f"{user_id}/{filename}"
+			public_url = save_image_to_storage(storage_path, stored_img.data, stored_img.mime_type) or storage_path
+			# Embedding is optional - image attachment succeeds even without face encoding
+			try:
+				encoding = encoding_future.result()
+			except Exception:
+				app.logger.warning('attach_image: encoding computation failed, continuing without embedding')
+				encoding = None
 			img_conn = get_db_conn()
 			img_cur = img_conn.cursor()
-			filename = f"{int(time.time())}_{uuid.uuid4().hex}.jpg"
-			storage_path = f"{user_id}/{filename}"
-			public_url = save_image_to_storage(storage_path, img_bytes) or storage_path
-			img_cur.execute(
-				"""
-					INSERT INTO public.user_images (user_id, storage_path, public_url, width, height, mime_type, uploaded_at, is_profile, file_size)
-					VALUES (%s, %s, %s, %s, %s, %s, now(), %s, %s)
-				""",
-				(
-					user_id,
-					storage_path,
-					public_url,
-					img_arr.shape[1],
-					img_arr.shape[0],
-					'image/jpeg',
-					True,
-					len(img_bytes),
-				),
-			)
+			stored = insert_user_image(img_cur, user_id, storage_path, public_url, stored_img, encoding, 'attach')
 			img_conn.commit()
 		except Exception:
 			try:
@@ -982,38 +1577,20 @@ def api_attach_image():
 			return jsonify({'ok': False, 'error': 'image_save_failed'}), 500
 		finally:
 			try:
-				img_cur.close()
-				img_conn.close()
+				if img_cur is not None:
+					img_cur.close()
 			except Exception:
 				pass
+			finally:
+				if img_conn is not None:
+					release_db_conn(img_conn)
 
-		# Try to compute encoding and insert embedding separately
-		# This is optional - image attachment succeeds even without face encoding
-		try:
-			encoding = compute_face_encoding(img_arr)
-			if encoding is not None:
-				emb_conn = get_db_conn()
-				emb_cur = emb_conn.cursor()
-				try:
-					insert_embedding(emb_cur, user_id, encoding, 'attach')
-					emb_conn.commit()
-					app.logger.info('attach_image: embedding inserted successfully')
-				except Exception:
-					try:
-						emb_conn.rollback()
-					except Exception:
-						pass
-					app.logger.warning('attach_image: failed to insert embedding, continuing')
-				finally:
-					try:
-						emb_cur.close()
-						emb_conn.close()
-					except Exception:
-						pass
-			else:
-				app.logger.warning('attach_image: no encoding computed (face_recognition unavailable or no face)')
-		except Exception:
-			app.logger.warning('attach_image: encoding computation failed, continuing without embedding')
+		if stored:
+			app.logger.info('attach_image: embedding inserted successfully')
+		elif encoding is None:
+			app.logger.warning('attach_image: no encoding computed (face_recognition unavailable or no face)')
+		else:
+			app.logger.warning('attach_image: failed to insert embedding, continuing')
 
 		return jsonify({'ok': True, 'storage_path': storage_path, 'public_url': public_url}), 201
 	except Exception as exc:
@@ -1021,106 +1598,127 @@ def api_attach_image():
 		return jsonify({'ok': False, 'error': 'unexpected', 'detail': str(exc)}), 500
 
 
+# Nearest-neighbour lookup for login. Same shape as public.find_nearest_embeddings
+# but issued inline, so the planner sees the ORDER BY ... LIMIT directly instead of
+# going through a function call; {vector_type} matches the column (vector/halfvec).
+# The transaction-local search_path and ef_search are set in the same round trip: HNSW_EF_SEARCH
+# when configured, otherwise a tier picked from pg_class.reltuples (the planner's
+# row estimate, so no count(*)), and never below the LIMIT since an HNSW scan
+# returns at most ef_search rows. The tiers match the index build options in
+# supabase_setup.sql: 40 under 100k rows, 100 under 1M, 200 above.
+_HNSW_EF_SEARCH_BY_SIZE = "CASE WHEN c.reltuples < 100000 THEN 40 WHEN c.reltuples < 1000000 THEN 100 ELSE 200 END"
+_SET_EF_SEARCH_SQL = _SET_LOCAL_SEARCH_PATH_SQL + """
+	SELECT set_config('hnsw.ef_search', LEAST(1000, GREATEST(%s, COALESCE(%s, """ + _HNSW_EF_SEARCH_BY_SIZE + """)))::text, true)
+	FROM pg_class c WHERE c.oid = 'public.embeddings'::regclass;
+"""
+
+# The matched user's row is joined onto the (already LIMITed) nearest rows so a
+# successful login needs no second query. LEFT JOIN so an embedding whose user
+# row is gone still reports its distance.
+_JOIN_MATCH_USER_SQL = """
+	SELECT n.id, n.user_id, n.dist, u.id, u.display_name, u.username, u.email
+	FROM ({nearest}) n
+	LEFT JOIN public.users u ON u.id = n.user_id
+	ORDER BY n.dist
+"""
+
+_NEAREST_EMBEDDINGS_SQL = _SET_EF_SEARCH_SQL + _JOIN_MATCH_USER_SQL.replace('{nearest}', """
+	SELECT id, user_id, embedding <-> %s::{vector_type} AS dist
+	FROM public.embeddings
+	ORDER BY embedding <-> %s::{vector_type}
+	LIMIT %s
+""")
+
+# Two-stage variant (LOGIN_PREFILTER_CANDIDATES): an HNSW walk over the 16-byte
+# binary_quantize() codes picks candidates, which are re-ranked by full L2.
+_NEAREST_EMBEDDINGS_PREFILTER_SQL = _SET_EF_SEARCH_SQL + _JOIN_MATCH_USER_SQL.replace('{nearest}', """
+	SELECT id, user_id, embedding <-> %s::{vector_type} AS dist
+	FROM (
+		SELECT id, user_id, embedding
+		FROM public.embeddings
+		ORDER BY binary_quantize(embedding)::bit(128) <~> binary_quantize(%s::{vector_type})
+		LIMIT %s
+	) candidates
+	ORDER BY dist
+	LIMIT %s
+""")
+
+
 @app.route('/api/login_face', methods=['POST'])
 def api_login_face():
 	"""Attempt face login using nearest-neighbor search.
 	
-	Requires pgvector extension and public.find_nearest_embeddings function.
+	Requires the pgvector extension and a vector / halfvec `embedding` column.
 	Returns 501 if pgvector is not available.
 	"""
 	payload = request.get_json(force=True) if request.is_json else request.form.to_dict()
 	# Accept either a data URL (`face_image` / `image`) or a storage path (`temp_storage_path` / `temp_path`)
+	file_bytes = uploaded_image_bytes()
 	data_url = payload.get('face_image') or payload.get('image')
 	temp_path = payload.get('temp_storage_path') or payload.get('temp_path')
 	storage_path = None
-	public_url = None
+	public_url_future = None
 
-	if not data_url and not temp_path:
+	if not file_bytes and not data_url and not temp_path:
 		return jsonify({'ok': False, 'error': 'missing_image'}), 400
-	# Accept temp storage path, data URL, HTTP(S) URL, or storage path.
+	# Accept a multipart file, temp storage path, data URL, HTTP(S) URL, or storage path.
 	try:
-		if temp_path:
-			# download the provided storage object and reuse its path (do NOT re-upload)
-			raw = download_from_storage(temp_path)
+		if file_bytes:
+			img_bytes = file_bytes
+			img_arr = decode_image_bytes(img_bytes)
+		elif temp_path:
+			# download the provided storage object and reuse its path (do NOT re-upload);
+			# only the encoding is needed, so a resized copy is fine
+			raw = read_temp_upload(temp_path, for_matching=True)
 			img_bytes = raw
-			from PIL import Image as PILImage
-			img = PILImage.open(io.BytesIO(img_bytes)).convert('RGB')
-			img_arr = np.array(img)
+			img_arr = decode_image_bytes(img_bytes)
 			storage_path = temp_path.lstrip('/')
-			public_url = _public_or_signed_url(storage_path) or storage_path
+			# URL signing is a Storage round trip; run it while the face is encoded
+			public_url_future = _IO_POOL.submit(_public_or_signed_url, storage_path)
 		else:
-			# If data_url is an HTTP(S) URL, fetch it. If it's a data URL, decode locally.
-			if isinstance(data_url, str) and (data_url.startswith('http://') or data_url.startswith('https://')):
-				import requests
-				rep = requests.get(data_url, timeout=20)
-				rep.raise_for_status()
-				img_bytes = rep.content
-				img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-				img_arr = np.array(img)
-			elif isinstance(data_url, str) and data_url.startswith('data:'):
-				img_arr, img_bytes = decode_base64_image(data_url)
-			else:
-				# treat as storage path: prefer resolving a public URL and fetching
-				fetched = False
-				if sb and SUPABASE_BUCKET:
-					try:
-						pub = _public_or_signed_url(data_url)
-						if pub:
-							import requests
-							r = requests.get(pub, timeout=20)
-							r.raise_for_status()
-							img_bytes = r.content
-							img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-							img_arr = np.array(img)
-							fetched = True
-					except Exception:
-						fetched = False
-				if not fetched:
-					try:
-						raw = download_from_storage(data_url)
-						img_bytes = raw
-						img = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-						img_arr = np.array(img)
-					except Exception:
-						# As a last resort, attempt to decode as data URL
-						img_arr, img_bytes = decode_base64_image(data_url)
-			# When not using temp_path, do not set storage_path/public_url here
-			if not temp_path:
-				storage_path = None
-				public_url = None
+			img_arr, img_bytes = load_image(data_url)
 	except Exception as exc:
 		return jsonify({'ok': False, 'error': 'bad_image', 'detail': str(exc)}), 400
 
-	encoding = compute_face_encoding(img_arr)
+	encoding = cached_face_encoding(img_bytes, img_arr)
 	if encoding is None:
 		return jsonify({'ok': False, 'error': 'no_face', 'message': 'No face detected. Ensure good lighting, clear focus on face, and try again.'}), 200
 
-	# Check if pgvector is available - required for nearest-neighbor lookup
-	use_vector = _detect_vector_type()
-	if not use_vector:
-		return jsonify({
-			'ok': False,
-			'error': 'nearest_embeddings_not_supported',
-			'detail': 'pgvector extension required for login_face. Enable pgvector in your Postgres database.'
-		}), 501
-
 	threshold = float(payload.get('threshold') or 0.5)
 	limit = int(payload.get('limit') or 1)
 
-	conn = get_db_conn()
-	cur = conn.cursor()
+	conn = cur = None
 	try:
-		# Use pgvector nearest-neighbor function
-		# Build the vector literal directly into SQL (safe because encoding is numeric list)
-		vec_vals = ','.join(str(float(x)) for x in encoding)
-		# Use schema-qualified vector type to avoid relying on connection search_path
-		# (the extension may be installed in vector_ext schema).
-		sql = f"""
-			SELECT embedding_id, user_id, dist
-			FROM public.find_nearest_embeddings(ARRAY[{vec_vals}]::vector_ext.vector(128), %s)
-		"""
+		conn = get_db_conn()
+		cur = conn.cursor()
+		# Check if pgvector is available - required for nearest-neighbor lookup.
+		# Normally known from the connection setup probe, so no extra round trip.
+		if not (conn.has_vector or _detect_vector_type(cur)):
+			return jsonify({
+				'ok': False,
+				'error': 'nearest_embeddings_not_supported',
+				'detail': 'pgvector extension required for login_face. Enable pgvector in your Postgres database.'
+			}), 501
+		if conn.embedding_type is not None and conn.embedding_type not in _VECTOR_COLUMN_TYPES:
+			return jsonify({
+				'ok': False,
+				'error': 'nearest_embeddings_not_supported',
+				'detail': 'public.embeddings.embedding is %s; convert it to vector(128) to enable login_face.' % conn.embedding_type
+			}), 501
+		# Query the table directly with the bare distance operator in ORDER BY and
+		# the LIMIT at the outer level, the shape pgvector's HNSW index scan needs.
+		# The query vector is bound as a parameter (pgvector text form) so the SQL
+		# text stays constant per column type.
+		vector_type = 'halfvec' if conn.embedding_type == 'halfvec' else 'vector'
+		vec_text = to_vector_text(encoding)
 		try:
-			cur.execute(sql, (limit,))
+			if LOGIN_PREFILTER_CANDIDATES > limit:
+				cur.execute(
+					_NEAREST_EMBEDDINGS_PREFILTER_SQL.format(vector_type=vector_type),
+					(LOGIN_PREFILTER_CANDIDATES, HNSW_EF_SEARCH, vec_text, vec_text, LOGIN_PREFILTER_CANDIDATES, limit),
+				)
+			else:
+				cur.execute(_NEAREST_EMBEDDINGS_SQL.format(vector_type=vector_type), (limit, HNSW_EF_SEARCH, vec_text, vec_text, limit))
 		except Exception as db_exc:
 			# Detect missing pgvector type/errors and return a helpful 501
 			msg = str(db_exc).lower()
@@ -1129,49 +1727,44 @@ def api_login_face():
 				return jsonify({
 					'ok': False,
 					'error': 'nearest_embeddings_not_supported',
-					'detail': 'pgvector extension or vector type not available in DB. Install/enable pgvector and create the helper function find_nearest_embeddings.'
+					'detail': 'pgvector extension or vector type not available in DB. Install/enable pgvector and convert public.embeddings.embedding to vector(128).'
 				}), 501
 			raise
 		row = cur.fetchone()
 		if not row:
 			conn.commit()
-			cur.close()
-			conn.close()
 			return jsonify({'ok': False, 'error': 'no_match'}), 200
 
-		_, user_id, dist = row
+		_, user_id, dist = row[:3]
 		if dist is None or float(dist) > threshold:
 			conn.commit()
-			cur.close()
-			conn.close()
 			return jsonify({'ok': False, 'error': 'no_match', 'min_distance': float(dist) if dist is not None else None}), 200
 
-		cur.execute('SELECT id, display_name, username, email FROM public.users WHERE id = %s', (user_id,))
-		user_row = cur.fetchone()
+		user_row = row[3:] if row[3] is not None else None
 		conn.commit()
 	except Exception as exc:
-		try:
-			conn.rollback()
-		except Exception:
-			pass
+		if conn is not None:
+			try:
+				conn.rollback()
+			except Exception:
+				pass
 		app.logger.exception('login_face: db error')
-		# Check if error is due to missing find_nearest_embeddings function
-		if 'find_nearest_embeddings' in str(exc) or 'does not exist' in str(exc):
+		# Check if error is due to a missing pgvector type or operator
+		if 'does not exist' in str(exc):
 			return jsonify({
 				'ok': False,
 				'error': 'nearest_embeddings_not_supported',
-				'detail': 'DB function find_nearest_embeddings not found. Create it using the SQL provided in supabase_setup.sql.'
+				'detail': 'pgvector nearest-neighbour query failed. Set up the embeddings table using the SQL provided in supabase_setup.sql.'
 			}), 501
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 	finally:
 		try:
-			cur.close()
-		except Exception:
-			pass
-		try:
-			conn.close()
+			if cur is not None:
+				cur.close()
 		except Exception:
 			pass
+		if conn is not None:
+			release_db_conn(conn)
 
 	if not user_row:
 		return jsonify({'ok': False, 'error': 'user_missing'}), 404
@@ -1189,10 +1782,34 @@ def api_login_face():
 	}
 	if storage_path:
 		resp['storage_path'] = storage_path
-		resp['public_url'] = public_url
+		try:
+			resp['public_url'] = public_url_future.result() or storage_path
+		except Exception:
+			app.logger.exception('login_face: failed to resolve public url')
+			resp['public_url'] = storage_path
 	return jsonify(resp), 200
 
 
+def _iso(value: Optional[datetime]) -> Optional[str]:
+	"""ISO 8601 text for a timestamptz column (psycopg2 returns datetime or None)."""
+	return value.isoformat() if value is not None else None
+
+
+# A user's embedding metadata as one JSON array built by Postgres, so no
+# per-row tuples or dicts are materialised in Python.
+_ADMIN_EMBEDDINGS_SQL = """
+	SELECT COALESCE(json_agg(json_build_object(
+		'id', id,
+		'user_id', user_id,
+		'source', source,
+		'created_at', created_at,
+		'has_embedding', embedding IS NOT NULL
+	) ORDER BY created_at DESC), '[]'::json)
+	FROM public.embeddings
+	WHERE user_id = %s
+"""
+
+
 @app.route('/api/admin/embeddings', methods=['GET'])
 def api_admin_embeddings():
 	"""Admin helper: return embedding metadata for a user. Not secure; intended for local testing only."""
@@ -1202,13 +1819,10 @@ def api_admin_embeddings():
 	try:
 		conn = get_db_conn()
 		cur = conn.cursor()
-		cur.execute("SELECT id, user_id, source, created_at, (embedding IS NOT NULL) as has_embedding FROM public.embeddings WHERE user_id = %s ORDER BY created_at DESC", (user_id,))
-		rows = cur.fetchall()
-		items = []
-		for r in rows:
-			items.append({'id': str(r[0]), 'user_id': str(r[1]), 'source': r[2], 'created_at': r[3].isoformat() if getattr(r[3],'isoformat',None) else str(r[3]), 'has_embedding': bool(r[4])})
+		cur.execute(_ADMIN_EMBEDDINGS_SQL, (user_id,))
+		items = cur.fetchone()[0]
 		cur.close()
-		conn.close()
+		release_db_conn(conn)
 		return jsonify({'ok': True, 'count': len(items), 'items': items}), 200
 	except Exception as exc:
 		app.logger.exception('admin/embeddings: db error')
@@ -1217,12 +1831,36 @@ def api_admin_embeddings():
 		except Exception:
 			pass
 		try:
-			conn.close()
+			release_db_conn(conn)
 		except Exception:
 			pass
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 
 
+# User row, its images (as a JSON array, already in response shape) and its
+# embedding count in one round trip.
+_GET_USER_SQL = """
+	SELECT u.id, u.display_name, u.username, u.email, u.phone, u.date_of_birth, u.emergency_contact,
+		u.medications, u.allergies, u.accessibility_needs, u.preferred_language, u.created_at,
+		img.images, emb.count
+	FROM public.users u
+	CROSS JOIN LATERAL (
+		SELECT COALESCE(json_agg(json_build_object(
+			'id', i.id,
+			'storage_path', i.storage_path,
+			'public_url', i.public_url,
+			'is_profile', COALESCE(i.is_profile, false),
+			'uploaded_at', i.uploaded_at
+		) ORDER BY i.uploaded_at DESC), '[]'::json) AS images
+		FROM public.user_images i WHERE i.user_id = u.id
+	) img
+	CROSS JOIN LATERAL (
+		SELECT count(*) AS count FROM public.embeddings e WHERE e.user_id = u.id
+	) emb
+	WHERE u.id = %s
+"""
+
+
 @app.route('/api/users/<user_id>', methods=['GET'])
 def api_get_user(user_id):
 	"""Return user record, images and embedding metadata."""
@@ -1234,11 +1872,11 @@ def api_get_user(user_id):
 	try:
 		conn = get_db_conn()
 		cur = conn.cursor()
-		cur.execute("SELECT id, display_name, username, email, phone, date_of_birth, emergency_contact, medications, allergies, accessibility_needs, preferred_language, created_at FROM public.users WHERE id = %s", (user_id,))
+		cur.execute(_GET_USER_SQL, (user_id,))
 		row = cur.fetchone()
 		if not row:
 			cur.close()
-			conn.close()
+			release_db_conn(conn)
 			return jsonify({'ok': False, 'error': 'user_missing'}), 404
 
 		user = {
@@ -1253,19 +1891,14 @@ def api_get_user(user_id):
 			'allergies': row[8],
 			'accessibility_needs': row[9],
 			'preferred_language': row[10],
-			'created_at': row[11].isoformat() if getattr(row[11], 'isoformat', None) else str(row[11])
+			'created_at': _iso(row[11])
 		}
 
-		cur.execute("SELECT id, storage_path, public_url, is_profile, uploaded_at FROM public.user_images WHERE user_id = %s ORDER BY uploaded_at DESC", (user_id,))
-		images = []
-		for r in cur.fetchall():
-			images.append({'id': str(r[0]), 'storage_path': r[1], 'public_url': r[2], 'is_profile': bool(r[3]), 'uploaded_at': r[4].isoformat() if getattr(r[4], 'isoformat', None) else str(r[4])})
-
-		cur.execute("SELECT count(*) FROM public.embeddings WHERE user_id = %s", (user_id,))
-		emb_count = cur.fetchone()[0]
+		images = row[12]
+		emb_count = row[13]
 
 		cur.close()
-		conn.close()
+		release_db_conn(conn)
 		return jsonify({'ok': True, 'user': user, 'images': images, 'embedding_count': int(emb_count)}), 200
 	except Exception as exc:
 		app.logger.exception('get_user: db error')
@@ -1274,21 +1907,34 @@ def api_get_user(user_id):
 		except Exception:
 			pass
 		try:
-			conn.close()
+			release_db_conn(conn)
 		except Exception:
 			pass
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 
 
+# Columns PUT /api/users/<id> may change, in the order their SET list is built
+_USER_UPDATE_FIELDS = ('display_name', 'email', 'phone', 'date_of_birth', 'emergency_contact', 'medications', 'allergies', 'accessibility_needs', 'preferred_language')
+_USER_JSON_FIELDS = frozenset(('emergency_contact', 'medications'))
+_UPDATE_USER_SQL_CACHE = {}
+
+
+def _update_user_sql(fields: Tuple[str, ...]) -> str:
+	"""UPDATE statement for this set of columns, built once per distinct set."""
+	sql = _UPDATE_USER_SQL_CACHE.get(fields)
+	if sql is None:
+		# fields only ever come from _USER_UPDATE_FIELDS, so there are at most
+		# 2**9 entries and the column names are safe to interpolate
+		sql = 'UPDATE public.users SET ' + ', '.join(f'{k} = %s' for k in fields) + ' WHERE id = %s RETURNING id'
+		_UPDATE_USER_SQL_CACHE[fields] = sql
+	return sql
+
+
 @app.route('/api/users/<user_id>', methods=['PUT'])
 def api_update_user(user_id):
 	"""Update allowed user fields."""
 	payload = request.get_json(force=True) if request.is_json else request.form.to_dict()
-	allowed = ['display_name', 'email', 'phone', 'date_of_birth', 'emergency_contact', 'medications', 'allergies', 'accessibility_needs', 'preferred_language']
-	updates = {}
-	for k in allowed:
-		if k in payload:
-			updates[k] = payload.get(k)
+	updates = {k: payload.get(k) for k in _USER_UPDATE_FIELDS if k in payload}
 
 	if not updates:
 		return jsonify({'ok': False, 'error': 'no_updates'}), 400
@@ -1302,38 +1948,23 @@ def api_update_user(user_id):
 		conn = get_db_conn()
 		cur = conn.cursor()
 		try:
-			try:
-				from psycopg2.extras import Json
-			except Exception:
-				Json = lambda x: json.dumps(x) if x is not None else None
-
-			set_clauses = []
-			params = []
-			for k, v in updates.items():
-				if k in ('emergency_contact', 'medications'):
-					set_clauses.append(f"{k} = %s")
-					params.append(Json(v) if v is not None else None)
-				else:
-					set_clauses.append(f"{k} = %s")
-					params.append(v)
-
+			params = [Json(v) if k in _USER_JSON_FIELDS and v is not None else v for k, v in updates.items()]
 			params.append(user_id)
-			sql = f"UPDATE public.users SET {', '.join(set_clauses)} WHERE id = %s RETURNING id"
-			cur.execute(sql, tuple(params))
+			cur.execute(_update_user_sql(tuple(updates)), params)
 			if not cur.fetchone():
 				conn.rollback()
 				cur.close()
-				conn.close()
+				release_db_conn(conn)
 				return jsonify({'ok': False, 'error': 'user_missing'}), 404
 			conn.commit()
 		except Exception as exc:
 			conn.rollback()
 			app.logger.exception('update_user: db error')
 			cur.close()
-			conn.close()
+			release_db_conn(conn)
 			return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 		cur.close()
-		conn.close()
+		release_db_conn(conn)
 		return jsonify({'ok': True}), 200
 	except Exception as exc:
 		app.logger.exception('update_user: unexpected')
@@ -1342,12 +1973,25 @@ def api_update_user(user_id):
 		except Exception:
 			pass
 		try:
-			conn.close()
+			release_db_conn(conn)
 		except Exception:
 			pass
 		return jsonify({'ok': False, 'error': 'unexpected', 'detail': str(exc)}), 500
 
 
+# All of a user's rows in one round trip. Every part of a data-modifying WITH
+# runs, whether or not the outer query reads it.
+_DELETE_USER_SQL = """
+	WITH emb AS (
+		DELETE FROM public.embeddings WHERE user_id = %s
+	), img AS (
+		DELETE FROM public.user_images WHERE user_id = %s RETURNING storage_path
+	)
+	DELETE FROM public.users WHERE id = %s
+	RETURNING ARRAY(SELECT storage_path FROM img WHERE storage_path IS NOT NULL)
+"""
+
+
 @app.route('/api/users/<user_id>', methods=['DELETE'])
 def api_delete_user(user_id):
 	"""Delete user and related DB rows. Attempts to remove storage files if configured.
@@ -1361,36 +2005,22 @@ def api_delete_user(user_id):
 	try:
 		conn = get_db_conn()
 		cur = conn.cursor()
-		# collect user image paths
-		cur.execute("SELECT storage_path FROM public.user_images WHERE user_id = %s", (user_id,))
-		paths = [r[0] for r in cur.fetchall() if r[0]]
-
-		# delete embeddings, images, then user
-		cur.execute("DELETE FROM public.embeddings WHERE user_id = %s", (user_id,))
-		cur.execute("DELETE FROM public.user_images WHERE user_id = %s", (user_id,))
-		cur.execute("DELETE FROM public.users WHERE id = %s RETURNING id", (user_id,))
+		# delete embeddings, images and the user in one statement, collecting the
+		# image paths for storage cleanup
+		cur.execute(_DELETE_USER_SQL, (user_id, user_id, user_id))
 		res = cur.fetchone()
 		if not res:
 			conn.rollback()
 			cur.close()
-			conn.close()
+			release_db_conn(conn)
 			return jsonify({'ok': False, 'error': 'user_missing'}), 404
 		conn.commit()
 		cur.close()
-		conn.close()
+		release_db_conn(conn)
+		conn = None  # released; keep the error path from releasing it again
+		paths = res[0] or []
 
-		removed_paths = []
-		if sb and SUPABASE_BUCKET and paths:
-			try:
-				for p in paths:
-					try:
-						# supabase storage client may accept list or single path depending on SDK
-						sb.storage.from_(SUPABASE_BUCKET).remove([p])
-						removed_paths.append(p)
-					except Exception:
-						app.logger.exception('failed to remove storage path: %s', p)
-			except Exception:
-				app.logger.exception('storage removal error')
+		removed_paths = remove_from_storage(paths)
 
 		return jsonify({'ok': True, 'removed_storage_paths': removed_paths}), 200
 	except Exception as exc:
@@ -1400,7 +2030,7 @@ def api_delete_user(user_id):
 		except Exception:
 			pass
 		try:
-			conn.close()
+			release_db_conn(conn)
 		except Exception:
 			pass
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
@@ -1415,41 +2045,35 @@ def api_delete_image(image_id):
 	if not actor:
 		return jsonify({'ok': False, 'error': 'forbidden', 'detail': 'missing actor identity'}), 403
 
+	try:
+		uuid.UUID(str(actor))
+	except ValueError:
+		return jsonify({'ok': False, 'error': 'forbidden', 'detail': 'not image owner'}), 403
+
 	try:
 		conn = get_db_conn()
 		cur = conn.cursor()
-		cur.execute("SELECT storage_path FROM public.user_images WHERE id = %s", (image_id,))
+		# ownership check and delete in one statement
+		cur.execute("DELETE FROM public.user_images WHERE id = %s AND user_id = %s RETURNING storage_path", (image_id, actor))
 		row = cur.fetchone()
 		if not row:
+			# nothing deleted: tell a missing image apart from someone else's
+			cur.execute("SELECT 1 FROM public.user_images WHERE id = %s", (image_id,))
+			exists = cur.fetchone()
+			conn.rollback()
 			cur.close()
-			conn.close()
+			release_db_conn(conn)
+			conn = None
+			if exists:
+				return jsonify({'ok': False, 'error': 'forbidden', 'detail': 'not image owner'}), 403
 			return jsonify({'ok': False, 'error': 'image_missing'}), 404
 		path = row[0]
-		# verify ownership
-		cur.execute("SELECT user_id FROM public.user_images WHERE id = %s", (image_id,))
-		owner_row = cur.fetchone()
-		if not owner_row or str(owner_row[0]) != str(actor):
-			cur.close()
-			conn.close()
-			return jsonify({'ok': False, 'error': 'forbidden', 'detail': 'not image owner'}), 403
-		cur.execute("DELETE FROM public.user_images WHERE id = %s RETURNING id", (image_id,))
-		res = cur.fetchone()
-		if not res:
-			conn.rollback()
-			cur.close()
-			conn.close()
-			return jsonify({'ok': False, 'error': 'delete_failed'}), 500
 		conn.commit()
 		cur.close()
-		conn.close()
+		release_db_conn(conn)
+		conn = None
 
-		removed = False
-		if sb and SUPABASE_BUCKET and path:
-			try:
-				sb.storage.from_(SUPABASE_BUCKET).remove([path])
-				removed = True
-			except Exception:
-				app.logger.exception('delete_image: storage remove failed for %s', path)
+		removed = bool(remove_from_storage([path]))
 
 		return jsonify({'ok': True, 'removed_from_storage': removed, 'storage_path': path}), 200
 	except Exception as exc:
@@ -1459,13 +2083,93 @@ def api_delete_image(image_id):
 		except Exception:
 			pass
 		try:
-			conn.close()
+			release_db_conn(conn)
 		except Exception:
 			pass
 		return jsonify({'ok': False, 'error': 'db_error', 'detail': str(exc)}), 500
 
 
+# Endpoints a batch may call, keyed to the step of the signup flow they serve.
+# Each step may appear at most once, so a batch costs at most one detection and
+# one face encoding (the register step) - the same as the two separate requests.
+_BATCH_ENDPOINTS = {
+	'api_detect_face': 'detect',
+	'api_register': 'register',
+	'signup_post': 'register',
+}
+
+# Upper bound on sub-requests accepted by a single /api/batch call.
+BATCH_MAX_ITEMS = len(set(_BATCH_ENDPOINTS.values()))
+
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+	"""Run the signup flow's detect_face and register calls in one HTTP round trip.
+
+	Body: `{"requests": [{"path": "/api/detect_face", "body": {...}}, {"path": "/signup", "body": {...}}]}`.
+	Only the endpoints in _BATCH_ENDPOINTS are accepted, each step at most once,
+	and item bodies must be JSON objects. Each item runs in its own app context
+	through normal routing, so validation is unchanged; `X-User-Id` is forwarded
+	when present. Returns `{ok: true, results: [{status, body}, ...]}` in request
+	order.
+	"""
+	payload = request.get_json(force=True, silent=True)
+	items = payload.get('requests') if isinstance(payload, dict) else payload
+	if not isinstance(items, list) or not items:
+		return jsonify({'ok': False, 'error': 'missing_requests'}), 400
+	if len(items) > BATCH_MAX_ITEMS:
+		return jsonify({'ok': False, 'error': 'too_many_requests', 'max': BATCH_MAX_ITEMS}), 400
+
+	actor = request.headers.get('X-User-Id')
+	headers = {'X-User-Id': actor} if actor else {}
+	adapter = app.url_map.bind('localhost')
+	seen_steps = set()
+	results = []
+	for item in items:
+		if not isinstance(item, dict):
+			results.append({'status': 400, 'body': {'ok': False, 'error': 'bad_request'}})
+			continue
+		path = item.get('path')
+		method = str(item.get('method') or 'POST').upper()
+		body = item.get('body')
+		try:
+			endpoint, _ = adapter.match(path.split('?', 1)[0], method=method) if isinstance(path, str) else (None, None)
+		except Exception:
+			endpoint = None
+		if endpoint not in _BATCH_ENDPOINTS:
+			results.append({'status': 400, 'body': {'ok': False, 'error': 'not_batchable', 'path': path, 'method': method}})
+			continue
+		step = _BATCH_ENDPOINTS[endpoint]
+		if step in seen_steps:
+			results.append({'status': 400, 'body': {'ok': False, 'error': 'duplicate_in_batch', 'path': path}})
+			continue
+		seen_steps.add(step)
+		if body is not None and not isinstance(body, dict):
+			# only JSON objects are forwarded; anything else would reach the
+			# endpoint as an empty payload
+			results.append({'status': 400, 'body': {'ok': False, 'error': 'json_body_required', 'path': path}})
+			continue
+		try:
+			# a fresh app context per item so sub-requests don't share `g`
+			with app.app_context(), app.test_request_context(path, method=method, json=body, headers=headers):
+				resp = app.full_dispatch_request()
+			results.append({'status': resp.status_code, 'body': resp.get_json(silent=True)})
+		except Exception as exc:
+			app.logger.exception('batch: sub-request failed: %s %s', method, path)
+			results.append({'status': 500, 'body': {'ok': False, 'error': 'unexpected', 'detail': str(exc)}})
+
+	return jsonify({'ok': True, 'results': results}), 200
+
+# Warm the dlib models at import so the first request doesn't pay the model
+# setup cost. Set FACE_WARMUP=0 to skip. Under gunicorn this is left to the
+# post_worker_init hook in gunicorn.conf.py, so it never runs in the pre-fork
+# master (which would create a CUDA context the workers can't use).
+if coerce_bool(os.getenv('FACE_WARMUP', '1')) and 'gunicorn' not in sys.modules:
+	_warm_face_models()
+
+
 if __name__ == '__main__':
 	os.makedirs(DATA_DIR, exist_ok=True)
 	print('webapp.py: launching Flask on http://0.0.0.0:5000', flush=True)
-	app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+	# Development server only; use `gunicorn -c gunicorn.conf.py webapp_new:app` in production.
+	app.run(host='0.0.0.0', port=5000, debug=coerce_bool(os.getenv('FLASK_DEBUG')), threaded=True)
\ No newline at end of file